@@ -1,16 +1,22 @@
+import base64
+import json
+
 import frappe
 from frappe import _
+from frappe.utils import cint, get_datetime
+
 from social_media.facebook.api import send_facebook_message
 from social_media.instragram.api import send_instagram_message
+from social_media.utils.broadcast import create_broadcast, get_progress
 from social_media.whatsapp.api import send_whatsapp_message
 
 
 @frappe.whitelist()
 def send_message(platform, recipient, message_content, message_type="text", **kwargs):
 	"""Unified API to send messages across all platforms"""
-	
+
 	platform = platform.lower()
-	
+
 	try:
 		if platform == "facebook":
 			return send_facebook_message(
@@ -19,7 +25,7 @@ def send_message(platform, recipient, message_content, message_type="text", **kw
 				message_type=message_type,
 				page_id=kwargs.get("page_id")
 			)
-		
+
 		elif platform == "instagram":
 			return send_instagram_message(
 				recipient_id=recipient,
@@ -27,7 +33,7 @@ def send_message(platform, recipient, message_content, message_type="text", **kw
 				message_type=message_type,
 				media_url=kwargs.get("media_url")
 			)
-		
+
 		elif platform == "whatsapp":
 			return send_whatsapp_message(
 				phone_number=recipient,
@@ -35,10 +41,10 @@ def send_message(platform, recipient, message_content, message_type="text", **kw
 				message_type=message_type,
 				media_url=kwargs.get("media_url")
 			)
-		
+
 		else:
 			return {"success": False, "error": f"Unsupported platform: {platform}"}
-	
+
 	except Exception as e:
 		frappe.log_error(f"Unified message send error: {str(e)}")
 		return {"success": False, "error": str(e)}
@@ -47,46 +53,96 @@ def send_message(platform, recipient, message_content, message_type="text", **kw
 @frappe.whitelist()
 def get_all_messages(limit=50):
 	"""Get messages from all platforms"""
-	
-	messages = []
-	
-	# Facebook messages
-	fb_messages = frappe.get_all(
-		"Facebook Message",
-		fields=["name", "sender_id", "recipient_id", "message_content", "timestamp", "status", "'Facebook' as platform"],
-		order_by="timestamp desc",
-		limit=limit//3
-	)
-	messages.extend(fb_messages)
-	
-	# Instagram messages
-	ig_messages = frappe.get_all(
-		"Instagram Message",
-		fields=["name", "sender_id", "recipient_id", "message_content", "timestamp", "status", "'Instagram' as platform"],
-		order_by="timestamp desc",
-		limit=limit//3
-	)
-	messages.extend(ig_messages)
-	
-	# WhatsApp messages
-	wa_messages = frappe.get_all(
-		"WhatsApp Message",
-		fields=["name", "phone_number as recipient_id", "message_content", "timestamp", "status", "'WhatsApp' as platform"],
-		order_by="timestamp desc",
-		limit=limit//3
+	return read_inbox(cint(limit) or 50)["messages"]
+
+
+@frappe.whitelist()
+def get_inbox(limit=50, cursor=None):
+	"""Get one page of messages from all platforms, newest first
+
+	Reads the Social Message index in (timestamp, name) order and the full
+	content from the message tables, one query per platform. Pass the
+	returned next_cursor to get the following page; every page costs the
+	same as the first. Pages hold at most 500 messages.
+	"""
+	return read_inbox(min(cint(limit) or 50, 500), cursor)
+
+
+def read_inbox(limit, cursor=None) -> dict:
+	"""Up to limit messages older than the cursor, with the cursor of the next page"""
+	filters, or_filters = [], []
+	if cursor:
+		timestamp, name = decode_cursor(cursor)
+		# (timestamp, name) < cursor, spelled out as a range on the timestamp index
+		filters = [["timestamp", "<=", timestamp]]
+		or_filters = [["timestamp", "<", timestamp], ["name", "<", name]]
+
+	rows = frappe.get_all(
+		"Social Message",
+		filters=filters,
+		or_filters=or_filters,
+		fields=[
+			"message_name as name", "message_doctype", "platform", "sender", "recipient",
+			"preview", "timestamp", "status", "conversation", "lead"
+		],
+		order_by="timestamp desc, name desc",
+		limit=limit
 	)
-	messages.extend(wa_messages)
-	
-	# Sort by timestamp
-	messages.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-	
-	return messages[:limit]
+
+	# Only the content lives outside the index; status is indexed where a platform has one
+	contents = {}
+	for doctype in {row.message_doctype for row in rows}:
+		contents.update(frappe.get_all(
+			doctype,
+			filters={"name": ["in", [row.name for row in rows if row.message_doctype == doctype]]},
+			fields=["name", "message_content"],
+			as_list=True
+		))
+
+	messages = [build_inbox_message(row, contents.get(row.name)) for row in rows]
+
+	next_cursor = None
+	if len(messages) == limit:
+		next_cursor = encode_cursor(messages[-1].timestamp, messages[-1].name)
+
+	return {"messages": messages, "next_cursor": next_cursor}
+
+
+def build_inbox_message(row, message_content) -> dict:
+	"""Inbox entry of an indexed message, in the fields get_all_messages always returned"""
+	# WhatsApp messages only carry the customer's number, served as recipient_id
+	is_whatsapp = row.message_doctype == "WhatsApp Message"
+
+	return frappe._dict({
+		"name": row.name,
+		"platform": row.platform,
+		"sender_id": None if is_whatsapp else row.sender,
+		"recipient_id": row.sender if is_whatsapp else row.recipient,
+		"message_content": message_content,
+		"preview": row.preview,
+		"timestamp": row.timestamp,
+		"status": row.status,
+		"conversation": row.conversation,
+		"lead": row.lead
+	})
+
+
+def encode_cursor(timestamp, name) -> str:
+	return base64.urlsafe_b64encode(json.dumps([str(timestamp), name]).encode()).decode()
+
+
+def decode_cursor(cursor):
+	try:
+		timestamp, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+		return get_datetime(timestamp), name
+	except Exception:
+		frappe.throw(_("Invalid inbox cursor"))
 
 
 @frappe.whitelist()
 def create_send_message(platform, recipient, message_content, message_type="text", **kwargs):
 	"""Create Send Message document"""
-	
+
 	send_msg = frappe.new_doc("Send Message")
 	send_msg.update({
 		"platform": platform.title(),
@@ -98,10 +154,10 @@ def create_send_message(platform, recipient, message_content, message_type="text
 		"send_immediately": kwargs.get("send_immediately", 1)
 	})
 	send_msg.insert()
-	
+
 	if send_msg.send_immediately:
 		send_msg.send_message()
-	
+
 	return {
 		"success": True,
 		"message": "Send Message created successfully",
@@ -112,24 +168,30 @@ def create_send_message(platform, recipient, message_content, message_type="text
 
 @frappe.whitelist()
 def bulk_send_messages(platform, recipients, message_content, message_type="text"):
-	"""Send messages to multiple recipients"""
-	
-	results = []
+	"""Send messages to multiple recipients
+
+	Recipients are queued as a Social Broadcast and sent by background jobs,
+	follow them with get_broadcast_progress.
+	"""
+
 	recipient_list = recipients.split(",") if isinstance(recipients, str) else recipients
-	
-	for recipient in recipient_list:
-		recipient = recipient.strip()
-		if recipient:
-			result = create_send_message(
-				platform=platform,
-				recipient=recipient,
-				message_content=message_content,
-				message_type=message_type
-			)
-			results.append({"recipient": recipient, "result": result})
-	
+	broadcast = create_broadcast(
+		platform=platform,
+		recipients=[recipient.strip() for recipient in recipient_list],
+		message_content=message_content,
+		message_type=message_type
+	)
+
 	return {
 		"success": True,
-		"message": f"Bulk messages created for {len(results)} recipients",
-		"results": results
-	}
\ No newline at end of file
+		"message": f"Bulk messages queued for {broadcast.total_recipients} recipients",
+		"broadcast": broadcast.name
+	}
+
+
+@frappe.whitelist()
+def get_broadcast_progress(broadcast):
+	"""Queued, sent and failed counts of a broadcast"""
+	frappe.has_permission("Social Broadcast", doc=broadcast, throw=True)
+
+	return get_progress(broadcast)
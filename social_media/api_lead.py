@@ -1,22 +1,27 @@
 import frappe
 from frappe import _
-from social_media.utils.lead_creation import create_lead_from_message, auto_create_leads_from_messages
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Count
+
+from social_media.config import get_setting
+from social_media.utils.lead_creation import auto_create_leads_from_messages, create_lead_from_message
+from social_media.utils.message_index import LEAD_STATS_CACHE_KEY
 
 
 @frappe.whitelist()
 def create_lead_from_social_message(message_type, message_id):
 	"""Manually create lead from social media message"""
-	
+
 	try:
 		message_doc = frappe.get_doc(message_type, message_id)
 		lead_name = create_lead_from_message(message_doc)
-		
+
 		return {
 			"success": True,
 			"message": f"Lead {lead_name} created successfully",
 			"lead_name": lead_name
 		}
-		
+
 	except Exception as e:
 		frappe.log_error(f"Manual lead creation failed: {str(e)}")
 		return {"success": False, "error": str(e)}
@@ -25,34 +30,44 @@ def create_lead_from_social_message(message_type, message_id):
 @frappe.whitelist()
 def get_lead_stats():
 	"""Get lead creation statistics"""
-	
-	stats = {}
-	
-	# WhatsApp leads
-	stats["whatsapp"] = {
-		"total_messages": frappe.db.count("WhatsApp Message"),
-		"leads_created": frappe.db.count("WhatsApp Message", {"lead": ["!=", ""]}),
-		"pending": frappe.db.count("WhatsApp Message", {"lead": ["is", "not set"]})
-	}
-	
-	# Facebook leads
-	stats["facebook"] = {
-		"total_messages": frappe.db.count("Facebook Message"),
-		"leads_created": frappe.db.count("Facebook Message", {"lead": ["!=", ""]}),
-		"pending": frappe.db.count("Facebook Message", {"lead": ["is", "not set"]})
-	}
-	
-	# Instagram leads
-	stats["instagram"] = {
-		"total_messages": frappe.db.count("Instagram Message"),
-		"leads_created": frappe.db.count("Instagram Message", {"lead": ["!=", ""]}),
-		"pending": frappe.db.count("Instagram Message", {"lead": ["is", "not set"]})
+
+	stats = frappe.cache().get_value(LEAD_STATS_CACHE_KEY)
+	if stats is None:
+		stats = compute_lead_stats()
+		frappe.cache().set_value(LEAD_STATS_CACHE_KEY, stats, expires_in_sec=get_setting("lead_stats_cache_ttl"))
+
+	return stats
+
+
+def compute_lead_stats():
+	"""Message and lead counts per platform, from one grouped read"""
+
+	stats = {
+		platform.lower(): {"total_messages": 0, "leads_created": 0, "pending": 0}
+		for platform in ("WhatsApp", "Facebook", "Instagram")
 	}
-	
+
+	table = frappe.qb.DocType("Social Message")
+	# An empty lead is as unlinked as a null one
+	linked = Case().when(table.lead.notnull() & (table.lead != ""), 1)
+	counts = (
+		frappe.qb.from_(table)
+		.select(table.platform, Count("*").as_("total"), Count(linked).as_("linked"))
+		.groupby(table.platform)
+		.run(as_dict=True)
+	)
+
+	for row in counts:
+		stats[row.platform.lower()] = {
+			"total_messages": row.total,
+			"leads_created": row.linked,
+			"pending": row.total - row.linked
+		}
+
 	return stats
 
 
 @frappe.whitelist()
 def run_auto_lead_creation():
 	"""Manually trigger auto lead creation"""
-	return auto_create_leads_from_messages()
\ No newline at end of file
+	return auto_create_leads_from_messages()
@@ -1,48 +1,89 @@
+import json
+import time
+
 import frappe
 from frappe import _
+from frappe.utils.background_jobs import is_job_enqueued
+
+from social_media.config import get_setting
 from social_media.connectors.meta.facebook import FacebookConnector
+from social_media.utils import chunked, run_concurrently
+from social_media.utils.ingestion import ingest_messages
+from social_media.utils.locks import acquire_lock, release_lock
+from social_media.utils.sync_scheduler import record_webhook_activity, reschedule_channel
+from social_media.utils.sync_watermarks import save_conversation_watermarks
+
+# Redis list of "idx:channel" entries a sync run has yet to start, per Social Sync Log
+SYNC_QUEUE_KEY = "social_media:sync_queue:{}"
+
+# Redis hash of the started entries whose job has not recorded a result yet, with their start time
+SYNC_RUNNING_KEY = "social_media:sync_running:{}"
+
+# Seconds a started entry may go without a visible job, covering jobs enqueued after commit
+SYNC_LOST_JOB_GRACE = 120
+
+# Move the next queued entry to the running hash; returns the entry, or nil when none is left
+START_ENTRY_SCRIPT = """
+local entry = redis.call('LPOP', KEYS[1])
+if entry then
+	redis.call('HSET', KEYS[2], entry, ARGV[1])
+	redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return entry
+"""
 
 
 @frappe.whitelist()
 def publish_social_post(post_id):
 	"""Publish social media post across platforms"""
-	
+
 	try:
 		post_doc = frappe.get_doc("Social Post", post_id)
-		
+
 		if post_doc.status != "Draft":
 			return {"success": False, "error": "Post is not in draft status"}
-		
+
 		post_doc.status = "Publishing"
 		post_doc.save()
-		
-		results = []
-		
+
+		targets = []
+
 		for platform in post_doc.platforms:
 			channel_doc = frappe.get_doc("Social Media Channel", platform.channel)
 			account_doc = frappe.get_doc("Social Account", {"channel": channel_doc.name})
-			
+
 			# Get appropriate connector
 			connector = get_connector(channel_doc.platform, account_doc)
-			
+
 			if connector:
-				result = connector.publish_post(post_doc)
-				
-				if result["success"]:
-					platform.status = "Published"
-					platform.platform_post_id = result.get("post_id")
-					platform.post_url = result.get("post_url")
-					platform.published_at = frappe.utils.now()
-				else:
-					platform.status = "Failed"
-					platform.error_message = result.get("error")
-				
-				results.append({
-					"platform": channel_doc.platform,
-					"success": result["success"],
-					"result": result
-				})
-		
+				targets.append((platform, channel_doc, connector))
+
+		# Publish to all channels in parallel, connectors share the Redis rate limiter
+		outcomes = run_concurrently(
+			lambda target: _publish_to_channel(target[2], post_doc),
+			targets,
+			get_setting("publish_concurrency")
+		)
+
+		results = []
+
+		for (platform, channel_doc, _connector), result in zip(targets, outcomes, strict=True):
+			if result["success"]:
+				platform.status = "Published"
+				platform.platform_post_id = result.get("post_id")
+				platform.post_url = result.get("post_url")
+				platform.published_at = frappe.utils.now()
+			else:
+				platform.status = "Failed"
+				platform.error_message = result.get("error")
+
+			results.append({
+				"platform": channel_doc.platform,
+				"channel": channel_doc.name,
+				"success": result["success"],
+				"result": result
+			})
+
 		# Update overall post status
 		if all(r["success"] for r in results):
 			post_doc.status = "Published"
@@ -51,30 +92,39 @@ def publish_social_post(post_id):
 			post_doc.status = "Partially Published"
 		else:
 			post_doc.status = "Failed"
-		
+
 		post_doc.save()
-		
+
 		return {
 			"success": True,
 			"message": f"Post published to {len([r for r in results if r['success']])} platforms",
 			"results": results
 		}
-		
+
 	except Exception as e:
 		frappe.log_error(f"Social post publish error: {str(e)}")
 		return {"success": False, "error": str(e)}
 
 
+def _publish_to_channel(connector, post_doc):
+	"""Publish a post through one connector, never raising"""
+	try:
+		return connector.publish_post(post_doc)
+	except Exception as e:
+		frappe.log_error(f"Social post publish error on {connector.channel.name}: {e!s}")
+		return {"success": False, "error": str(e)}
+
+
 @frappe.whitelist()
 def schedule_social_post(post_id, scheduled_time):
 	"""Schedule social media post"""
-	
+
 	try:
 		post_doc = frappe.get_doc("Social Post", post_id)
 		post_doc.scheduled_time = scheduled_time
 		post_doc.status = "Scheduled"
 		post_doc.save()
-		
+
 		# Enqueue publishing job
 		frappe.enqueue(
 			"social_media.api_social.publish_social_post",
@@ -82,12 +132,12 @@ def schedule_social_post(post_id, scheduled_time):
 			queue="long",
 			at_time=scheduled_time
 		)
-		
+
 		return {
 			"success": True,
 			"message": f"Post scheduled for {scheduled_time}"
 		}
-		
+
 	except Exception as e:
 		frappe.log_error(f"Social post schedule error: {str(e)}")
 		return {"success": False, "error": str(e)}
@@ -96,32 +146,32 @@ def schedule_social_post(post_id, scheduled_time):
 @frappe.whitelist()
 def get_social_analytics(channel=None, date_range=None):
 	"""Get social media analytics"""
-	
+
 	try:
 		if channel:
 			channel_doc = frappe.get_doc("Social Media Channel", channel)
 			account_doc = frappe.get_doc("Social Account", {"channel": channel})
-			
+
 			connector = get_connector(channel_doc.platform, account_doc)
-			
+
 			if connector:
 				return connector.get_analytics(date_range=date_range)
-		
+
 		# Get analytics for all channels
 		channels = frappe.get_all("Social Media Channel", {"status": "Active"})
 		analytics = {}
-		
+
 		for ch in channels:
 			channel_doc = frappe.get_doc("Social Media Channel", ch.name)
 			account_doc = frappe.get_doc("Social Account", {"channel": ch.name})
-			
+
 			connector = get_connector(channel_doc.platform, account_doc)
-			
+
 			if connector:
 				analytics[ch.name] = connector.get_analytics(date_range=date_range)
-		
+
 		return {"success": True, "analytics": analytics}
-		
+
 	except Exception as e:
 		frappe.log_error(f"Social analytics error: {str(e)}")
 		return {"success": False, "error": str(e)}
@@ -129,143 +179,394 @@ def get_social_analytics(channel=None, date_range=None):
 
 @frappe.whitelist()
 def sync_social_messages(channel=None):
-	"""Sync messages from social platforms"""
-	
+	"""Sync messages from social platforms
+
+	Fans out into one background job per channel, at most sync_concurrency at
+	a time: each finishing job starts the next queued channel. Results are
+	collected on the Social Sync Log returned.
+	"""
+
 	try:
 		if channel:
 			channels = [channel]
 		else:
 			channels = frappe.get_all("Social Media Channel", {"status": "Active"}, pluck="name")
-		
-		total_messages = 0
-		
-		for ch in channels:
-			channel_doc = frappe.get_doc("Social Media Channel", ch)
-			account_doc = frappe.get_doc("Social Account", {"channel": ch})
-			
-			connector = get_connector(channel_doc.platform, account_doc)
-			
-			if connector:
-				messages = connector.fetch_messages(since=channel_doc.last_sync)
-				
-				for msg in messages:
-					# Create conversation and message records
-					create_conversation_from_message(msg, channel_doc)
-				
-				total_messages += len(messages)
-				
-				# Update last sync time
-				channel_doc.last_sync = frappe.utils.now()
-				channel_doc.save()
-		
+
+		if not channels:
+			return {"success": True, "message": "No active channels to sync"}
+
 		return {
 			"success": True,
-			"message": f"Synced {total_messages} messages from {len(channels)} channels"
+			"message": f"Queued sync of {len(channels)} channels",
+			"sync_log": start_sync_run(channels)
 		}
-		
+
 	except Exception as e:
 		frappe.log_error(f"Social sync error: {str(e)}")
 		return {"success": False, "error": str(e)}
 
 
+def start_sync_run(channels) -> str:
+	"""Create a Social Sync Log for the channels and start its first channel jobs"""
+	sync_log = frappe.get_doc({
+		"doctype": "Social Sync Log",
+		"status": "Running",
+		"started_at": frappe.utils.now(),
+		"total_channels": len(channels)
+	}).insert(ignore_permissions=True)
+
+	cache = frappe.cache()
+	key = cache.make_key(SYNC_QUEUE_KEY.format(sync_log.name))
+	pipe = cache.pipeline()
+	pipe.rpush(key, *[f"{idx}:{ch}" for idx, ch in enumerate(channels, 1)])
+	pipe.expire(key, 86400)
+	pipe.execute()
+
+	for _lane in range(min(get_setting("sync_concurrency"), len(channels))):
+		start_next_channel_sync(sync_log.name, enqueue_after_commit=True)
+
+	return sync_log.name
+
+
+def start_next_channel_sync(sync_log, enqueue_after_commit=False):
+	"""Enqueue the job of the next channel a sync run has not started yet"""
+	cache = frappe.cache()
+	entry = cache.eval(
+		START_ENTRY_SCRIPT,
+		2,
+		cache.make_key(SYNC_QUEUE_KEY.format(sync_log)),
+		cache.make_key(SYNC_RUNNING_KEY.format(sync_log)),
+		time.time(),
+		86400
+	)
+	if not entry:
+		return
+
+	idx, channel = entry.decode().split(":", 1)
+	frappe.enqueue(
+		"social_media.api_social.sync_channel_job",
+		queue="long",
+		timeout=get_setting("sync_lock_timeout"),
+		job_id=get_sync_job_id(sync_log, channel),
+		enqueue_after_commit=enqueue_after_commit,
+		channel=channel,
+		sync_log=sync_log,
+		idx=int(idx)
+	)
+
+
+def sync_channel_job(channel, sync_log, idx=None):
+	"""Background job syncing one channel of a sync run under the channel's lock"""
+	started_at = frappe.utils.now()
+	lock = f"social_media:sync_lock:{channel}"
+
+	try:
+		token = acquire_lock(lock, get_setting("sync_lock_timeout"))
+		if not token:
+			result = {"status": "Skipped", "error": "Another sync of this channel is still running"}
+		else:
+			try:
+				result = sync_channel(channel)
+				result["status"] = "Success"
+			except Exception as e:
+				frappe.db.rollback()
+				frappe.log_error(f"Social sync error for {channel}: {e!s}")
+				result = {"status": "Failed", "error": str(e)}
+			finally:
+				release_lock(lock, token)
+
+		record_channel_result(sync_log, channel, idx, started_at, result)
+		if result["status"] != "Skipped":
+			# Fetch errors leave the message count short, so they don't count as an idle channel
+			failed = result["status"] == "Failed" or bool(result.get("error"))
+			reschedule_channel(channel, result.get("messages"), failed=failed)
+
+		frappe.db.commit()
+
+		clear_running_entry(sync_log, f"{idx}:{channel}")
+	finally:
+		start_next_channel_sync(sync_log)
+
+
+def resume_sync_runs():
+	"""Scheduler job finishing sync runs whose channel jobs were lost with a worker
+
+	A channel whose job is gone without a result is recorded as failed and the
+	run's next channel is started in its place. A run with nothing queued or
+	running left, e.g. once its Redis keys expired, is closed.
+	"""
+	cache = frappe.cache()
+
+	for sync_log in frappe.get_all("Social Sync Log", filters={"status": "Running"}, pluck="name"):
+		pipe = cache.pipeline()
+		pipe.hgetall(cache.make_key(SYNC_RUNNING_KEY.format(sync_log)))
+		pipe.llen(cache.make_key(SYNC_QUEUE_KEY.format(sync_log)))
+		running, queued = pipe.execute()
+
+		for entry, started in running.items():
+			entry = entry.decode()
+			idx, channel = entry.split(":", 1)
+
+			if time.time() - float(started) < SYNC_LOST_JOB_GRACE or is_job_enqueued(get_sync_job_id(sync_log, channel)):
+				continue
+
+			record_channel_result(sync_log, channel, int(idx), None, {
+				"status": "Failed",
+				"error": "The sync job was lost before it finished"
+			})
+			frappe.db.commit()
+
+			clear_running_entry(sync_log, entry)
+			start_next_channel_sync(sync_log)
+
+		if not running and not queued:
+			close_sync_run(sync_log)
+
+
+def clear_running_entry(sync_log, entry):
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.hdel(cache.make_key(SYNC_RUNNING_KEY.format(sync_log)), entry)
+	pipe.execute()
+
+
+def close_sync_run(sync_log):
+	"""Close a run none of whose remaining channels will report, counting them as failed"""
+	frappe.db.sql(
+		"""update `tabSocial Sync Log` set
+			failed_channels = failed_channels + total_channels - processed_channels,
+			processed_channels = total_channels,
+			finished_at = %(now)s,
+			status = 'Completed with Errors'
+		where name = %(name)s and status = 'Running'""",
+		{"name": sync_log, "now": frappe.utils.now()}
+	)
+	frappe.db.commit()
+
+
+def get_sync_job_id(sync_log, channel) -> str:
+	return f"social_media_sync:{sync_log}:{channel}"
+
+
+def sync_channel(channel) -> dict:
+	"""Fetch and store the new messages of one channel"""
+	channel_doc = frappe.get_doc("Social Media Channel", channel)
+	account_doc = frappe.get_doc("Social Account", {"channel": channel})
+
+	connector = get_connector(channel_doc.platform, account_doc)
+	if not connector:
+		return {"messages": 0, "requests": 0}
+
+	total_messages = 0
+
+	# Resume a listing that ran out of budget or failed in the previous sync
+	cursor_key = f"social_media:sync_cursor:{channel}"
+	cursor = frappe.cache().get_value(cursor_key) or {"since": channel_doc.last_sync, "started": frappe.utils.now()}
+
+	messages = connector.iter_messages(
+		since=cursor.get("since"),
+		max_items=get_setting("sync_max_items"),
+		max_pages=get_setting("sync_max_pages"),
+		cursor=cursor
+	)
+
+	# Consume the stream in fixed-size chunks to keep memory bounded
+	failed = set()
+	for chunk in chunked(messages, get_setting("sync_chunk_size")):
+		# Create conversation and message records, a handful of queries per chunk
+		try:
+			total_messages += ingest_messages(chunk, channel_doc)["messages"]
+			# Releases the naming series row, shared with other channel jobs and webhooks,
+			# before the next page is fetched
+			frappe.db.commit()
+		except Exception as e:
+			frappe.db.rollback()
+			failed.update(message.get("conversation_id") for message in chunk)
+			frappe.log_error(f"Message ingestion error for {channel}: {e!s}")
+
+	# Advance watermarks only of conversations whose new messages were all stored
+	save_conversation_watermarks(channel, {
+		conversation: watermark
+		for conversation, watermark in connector.watermarks.items()
+		if conversation not in failed
+	})
+
+	# Only a listing read to its end moves last_sync, to when the listing began;
+	# a budget stop or a failed page keeps the cursor for the next sync
+	if cursor.get("done"):
+		frappe.cache().delete_value(cursor_key)
+
+		# Only last_sync, the channel loaded above may be stale by now (webhook activity, next poll)
+		frappe.db.set_value(
+			"Social Media Channel",
+			channel,
+			"last_sync",
+			cursor.get("started") or frappe.utils.now(),
+			update_modified=False
+		)
+	else:
+		frappe.cache().set_value(cursor_key, cursor, expires_in_sec=86400)
+
+	return {
+		"messages": total_messages,
+		"requests": connector.request_count,
+		"error": json.dumps(connector.fetch_errors) if connector.fetch_errors else None
+	}
+
+
+def record_channel_result(sync_log, channel, idx, started_at, result):
+	"""Add a channel's outcome to its sync run, closing the run with its last channel"""
+	frappe.get_doc({
+		"doctype": "Social Sync Log Channel",
+		"parent": sync_log,
+		"parenttype": "Social Sync Log",
+		"parentfield": "channels",
+		"idx": idx,
+		"channel": channel,
+		"status": result["status"],
+		"messages": result.get("messages") or 0,
+		"requests": result.get("requests") or 0,
+		"started_at": started_at,
+		"finished_at": frappe.utils.now(),
+		"error": result.get("error")
+	}).db_insert()
+
+	# One atomic UPDATE, as channel jobs finish concurrently. MariaDB applies SET
+	# clauses left to right, so the status sees the incremented counters.
+	frappe.db.sql(
+		"""update `tabSocial Sync Log` set
+			processed_channels = processed_channels + 1,
+			failed_channels = failed_channels + %(failed)s,
+			skipped_channels = skipped_channels + %(skipped)s,
+			total_messages = total_messages + %(messages)s,
+			total_requests = total_requests + %(requests)s,
+			finished_at = if(processed_channels >= total_channels, %(now)s, finished_at),
+			status = if(processed_channels < total_channels, status,
+				if(failed_channels > 0, 'Completed with Errors', 'Completed'))
+		where name = %(name)s""",
+		{
+			"name": sync_log,
+			"failed": int(result["status"] == "Failed"),
+			"skipped": int(result["status"] == "Skipped"),
+			"messages": result.get("messages") or 0,
+			"requests": result.get("requests") or 0,
+			"now": frappe.utils.now()
+		}
+	)
+
+
 def get_connector(platform, account_doc):
 	"""Get appropriate connector for platform"""
-	
+
 	connectors = {
 		"Facebook": FacebookConnector,
 		"Instagram": FacebookConnector,  # Instagram uses Facebook Graph API
 		# Add more connectors here
 	}
-	
+
 	connector_class = connectors.get(platform)
-	
+
 	if connector_class:
 		return connector_class(account_doc)
-	
+
 	return None
 
 
 def create_conversation_from_message(message_data, channel_doc):
 	"""Create conversation and message records from platform message"""
-	
+
 	try:
-		# Check if conversation exists
-		conversation = frappe.db.exists("Conversation", {
-			"channel": channel_doc.name,
-			"external_id": message_data.get("conversation_id")
-		})
-		
-		if not conversation:
-			# Create new conversation
-			conv_doc = frappe.new_doc("Conversation")
-			conv_doc.update({
-				"channel": channel_doc.name,
-				"external_id": message_data.get("conversation_id"),
-				"participants": message_data.get("participants", ""),
-				"status": "Open",
-				"last_message_time": message_data.get("created_time")
-			})
-			conv_doc.insert()
-			conversation = conv_doc.name
-		
-		# Create message record (reuse existing message DocTypes)
-		if channel_doc.platform == "Facebook":
-			msg_doc = frappe.new_doc("Facebook Message")
-		elif channel_doc.platform == "Instagram":
-			msg_doc = frappe.new_doc("Instagram Message")
-		elif channel_doc.platform == "WhatsApp":
-			msg_doc = frappe.new_doc("WhatsApp Message")
-		
-		if msg_doc:
-			msg_doc.update({
-				"message_id": message_data.get("id"),
-				"sender_id": message_data.get("from", {}).get("id"),
-				"message_content": message_data.get("message"),
-				"timestamp": message_data.get("created_time"),
-				"conversation_id": conversation,
-				"status": "received"
-			})
-			msg_doc.insert()
-		
+		ingest_messages([message_data], channel_doc)
+
 	except Exception as e:
 		frappe.log_error(f"Create conversation error: {str(e)}")
 
 
 @frappe.whitelist(allow_guest=True)
 def webhook_receiver(platform):
-	"""Receive webhooks from social platforms"""
-	
+	"""Receive webhooks from social platforms, queue them and acknowledge right away"""
+
 	try:
 		data = frappe.local.form_dict
-		
+
 		# Verify webhook signature (platform-specific)
 		if not verify_webhook_signature(platform, data):
 			frappe.throw("Invalid webhook signature")
-		
-		# Get connector and process webhook
-		channels = frappe.get_all("Social Media Channel", {"platform": platform, "status": "Active"})
-		
-		for ch in channels:
-			channel_doc = frappe.get_doc("Social Media Channel", ch.name)
-			account_doc = frappe.get_doc("Social Account", {"channel": ch.name})
-			
-			connector = get_connector(platform, account_doc)
-			
-			if connector:
-				result = connector.process_webhook(data)
-				
-				if not result.get("success"):
-					frappe.log_error(f"Webhook processing failed: {result.get('error')}")
-		
+
+		entries = data.get("entry")
+		if not isinstance(entries, list):
+			return {"success": False, "error": "Webhook payload has no entries"}
+
+		# Routing and processing happen in the background, the platform only waits for the enqueue
+		frappe.enqueue(
+			"social_media.api_social.process_webhook_event",
+			queue="short",
+			platform=platform,
+			event_data={"object": data.get("object"), "entry": entries}
+		)
+
 		return {"success": True}
-		
+
 	except Exception as e:
 		frappe.log_error(f"Webhook receiver error: {str(e)}")
 		return {"success": False, "error": str(e)}
 
 
+def process_webhook_event(platform, event_data):
+	"""Background job routing each webhook entry to the channel it belongs to"""
+
+	entries = event_data.get("entry") or []
+
+	# Group entries by channel account: the page / Instagram account id, or the
+	# WhatsApp phone number id carried in the change metadata
+	entries_by_account = {}
+	for entry in entries:
+		entries_by_account.setdefault(_get_entry_account_id(entry), []).append(entry)
+
+	channels = frappe.get_all(
+		"Social Media Channel",
+		filters={
+			"platform": platform,
+			"status": "Active",
+			"account_id": ["in", list(entries_by_account)]
+		},
+		fields=["name", "account_id"]
+	)
+
+	# Channels fed by webhooks are left out of scheduled polling for a while
+	record_webhook_activity([ch.name for ch in channels if ch.account_id in entries_by_account])
+
+	for ch in channels:
+		# Exactly one channel handles an account's entries
+		channel_entries = entries_by_account.pop(ch.account_id, None)
+		if not channel_entries:
+			continue
+
+		account_doc = frappe.get_doc("Social Account", {"channel": ch.name})
+		connector = get_connector(platform, account_doc)
+
+		if connector:
+			result = connector.process_webhook({**event_data, "entry": channel_entries})
+
+			if not result.get("success"):
+				frappe.log_error(f"Webhook processing failed for {ch.name}: {result.get('error')}")
+
+	if entries_by_account:
+		frappe.log_error(f"Webhook entries for unknown {platform} accounts: {', '.join(map(str, entries_by_account))}")
+
+
+def _get_entry_account_id(entry):
+	"""Get the channel account id a webhook entry is addressed to"""
+	for change in entry.get("changes") or []:
+		phone_number_id = (change.get("value") or {}).get("metadata", {}).get("phone_number_id")
+		if phone_number_id:
+			return phone_number_id
+
+	return entry.get("id")
+
+
 def verify_webhook_signature(platform, data):
 	"""Verify webhook signature for security"""
 	# Platform-specific signature verification
 	# This is a simplified version - implement proper verification
-	return True
\ No newline at end of file
+	return True
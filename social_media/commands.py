@@ -0,0 +1,22 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-social-message-index")
+@pass_context
+def rebuild_social_message_index(context):
+	"""Rebuild the Social Message inbox index from the message tables"""
+	from social_media.utils.message_index import rebuild_message_index
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+
+	try:
+		rebuild_message_index()
+	finally:
+		frappe.destroy()
+
+
+commands = [rebuild_social_message_index]
@@ -0,0 +1,74 @@
+import frappe
+
+# Defaults for tunables that can be overridden from site_config.json
+# using the same key prefixed with "social_media_", e.g. "social_media_http_timeout"
+DEFAULTS = {
+	# (connect, read) timeout in seconds for platform API calls
+	"http_timeout": [3.05, 30],
+	# Connection pool sizing, per platform host
+	"http_pool_connections": 10,
+	"http_pool_maxsize": 20,
+	"http_pools": {},
+	# Token buckets shared by all workers, per app / page / WhatsApp phone number
+	"rate_limits": {
+		"app": {"capacity": 100, "refill_rate": 10},
+		"page": {"capacity": 50, "refill_rate": 5},
+		"phone": {"capacity": 80, "refill_rate": 20},
+	},
+	# Longest a caller sleeps for a token; a longer wait raises RateLimitExceeded instead
+	"rate_limit_max_wait": 60,
+	# Block window when usage hits 100% without an estimated regain time
+	"rate_limit_block_seconds": 300,
+	# Fetch conversation messages through Graph batch requests
+	"graph_batch_requests": True,
+	# Messages handled per chunk while syncing, and optional per-sync budgets
+	"sync_chunk_size": 200,
+	"sync_max_items": None,
+	"sync_max_pages": None,
+	# Channel sync jobs running at once, and seconds a channel stays locked by a sync run
+	"sync_concurrency": 4,
+	"sync_lock_timeout": 3600,
+	# Bounds in seconds of a channel's adaptive poll interval, and how long a webhook keeps it from being polled
+	"sync_min_interval": 60,
+	"sync_max_interval": 3600,
+	"sync_webhook_quiet_period": 900,
+	# Channels a post is published to in parallel
+	"publish_concurrency": 8,
+	# Attachments of a post uploaded in parallel
+	"media_upload_concurrency": 4,
+	# Shard jobs sending a broadcast in parallel, rows inserted / fetched per chunk,
+	# and messages sent between commits (the most a crashed shard can send twice)
+	"broadcast_concurrency": 8,
+	"broadcast_chunk_size": 1000,
+	"broadcast_commit_interval": 50,
+	# Seconds a decrypted access token is reused within a worker process
+	"credential_cache_ttl": 300,
+	# Messages linked to leads per chunk by the batch lead engine
+	"lead_batch_size": 500,
+	# Seconds the deferred lead job waits for a burst of messages to land before draining
+	"lead_coalesce_window": 5,
+	# Region (e.g. "BD") for phone numbers stored without a country code, defaults to the system country
+	"default_phone_region": None,
+	# Seconds get_lead_stats is served from cache between message inserts
+	"lead_stats_cache_ttl": 60,
+	# Recently stored message ids remembered per worker to drop replayed webhooks
+	"dedupe_cache_size": 10000,
+	# Retries of transient API failures, exponential backoff capped at max delay
+	"retry_max_retries": 3,
+	"retry_base_delay": 0.5,
+	"retry_max_delay": 30,
+	# Server errors per host/page within the window that open the circuit
+	"circuit_failure_threshold": 5,
+	"circuit_window": 60,
+	"circuit_cooldown": 30,
+}
+
+
+def get_setting(key, default=None):
+	"""Get app tunable from site config, falling back to app defaults"""
+	value = frappe.conf.get(f"social_media_{key}")
+
+	if value is None:
+		value = DEFAULTS.get(key, default)
+
+	return value
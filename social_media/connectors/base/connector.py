@@ -1,101 +1,570 @@
-import frappe
+import json
+import random
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from collections.abc import Iterator
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+
+import frappe
 import requests
-import time
+from urllib3.exceptions import NewConnectionError
+
+from social_media.config import get_setting
+from social_media.connectors.base import transport
 
 
 class BaseConnector(ABC):
 	"""Base class for all social media connectors"""
-	
+
 	def __init__(self, account_doc):
 		self.account = account_doc
-		self.channel = frappe.get_doc("Social Media Channel", account_doc.channel)
-		self.rate_limiter = RateLimiter(self.channel.platform)
-	
+		self.channel = frappe.get_cached_doc("Social Media Channel", account_doc.channel)
+		self.rate_limiter = self._get_rate_limiter()
+		self.retry_policy = RetryPolicy()
+		# HTTP calls made and per-item fetch errors, reported by sync jobs
+		self.request_count = 0
+		self.fetch_errors = {}
+		# Per-conversation sync watermarks, saved by sync jobs after ingestion
+		self.watermarks = {}
+
+	def _get_rate_limiter(self):
+		"""Rate limiter with buckets for the app and the page / phone number"""
+		scope = "phone_number_id" if self.channel.platform == "WhatsApp" else "page_id"
+
+		return RateLimiter(
+			self.channel.platform,
+			app_id=self.account.app_id,
+			**{scope: self.channel.account_id}
+		)
+
 	@abstractmethod
 	def publish_post(self, post_doc) -> Dict[str, Any]:
 		"""Publish a post to the platform"""
 		pass
-	
+
 	@abstractmethod
 	def schedule_post(self, post_doc, scheduled_time) -> Dict[str, Any]:
 		"""Schedule a post for later publishing"""
 		pass
-	
+
 	@abstractmethod
 	def fetch_messages(self, since=None) -> List[Dict]:
 		"""Fetch new messages/comments"""
 		pass
-	
+
+	def iter_messages(self, since=None, max_items=None, max_pages=None, cursor=None) -> Iterator[dict]:
+		"""Lazily yield new messages/comments, connectors override this to stream"""
+		messages = self.fetch_messages(since=since)
+		yield from islice(messages, max_items)
+
+		if cursor is not None and (max_items is None or len(messages) <= max_items):
+			cursor["done"] = True
+
 	@abstractmethod
 	def process_webhook(self, event_data) -> Dict[str, Any]:
 		"""Process incoming webhook event"""
 		pass
-	
+
 	@abstractmethod
 	def get_analytics(self, post_id=None, date_range=None) -> Dict[str, Any]:
 		"""Get analytics data"""
 		pass
-	
+
 	def refresh_token(self) -> bool:
 		"""Refresh OAuth token if needed"""
 		if not self.account.refresh_token:
 			return False
-		
+
 		try:
 			# Implementation varies by platform
 			return self._refresh_oauth_token()
 		except Exception as e:
 			frappe.log_error(f"Token refresh failed: {str(e)}")
 			return False
-	
+
 	@abstractmethod
 	def _refresh_oauth_token(self) -> bool:
 		"""Platform-specific token refresh"""
 		pass
-	
-	def make_request(self, method, url, **kwargs):
-		"""Make rate-limited API request"""
-		self.rate_limiter.wait_if_needed()
-		
+
+	def make_request(self, method, url, idempotent=None, **kwargs):
+		"""Make rate-limited API request, retrying transient failures with backoff
+
+		Non-idempotent calls (publishing, uploads, batch POSTs) are only sent
+		again when they cannot have reached Graph or were throttled, so a lost
+		response never publishes twice. idempotent overrides the method's default,
+		e.g. for a batch of reads sent as a POST.
+		"""
+		if idempotent is None:
+			idempotent = method.upper() in self.retry_policy.IDEMPOTENT_METHODS
+
+		breaker = CircuitBreaker(f"{urlsplit(url).netloc}:{self.channel.account_id}")
+
 		# Add auth headers
 		headers = kwargs.get('headers', {})
 		headers.update(self._get_auth_headers())
 		kwargs['headers'] = headers
-		
-		response = requests.request(method, url, **kwargs)
-		
-		# Update rate limit info
-		self.rate_limiter.update_from_response(response)
-		
-		if response.status_code == 401:
-			# Token expired, try refresh
-			if self.refresh_token():
-				headers.update(self._get_auth_headers())
-				response = requests.request(method, url, **kwargs)
-		
-		return response
-	
+
+		attempt = 0
+		token_refreshed = False
+
+		while True:
+			# Checked before every attempt, retries stop once the circuit opens
+			if not breaker.allow():
+				raise CircuitOpenError(f"{breaker.name} is failing, skipping calls until it recovers")
+
+			self.rate_limiter.wait_if_needed()
+
+			try:
+				# Pooled keep-alive session shared by all connectors in this process
+				response = transport.request(method, url, **kwargs)
+				self.request_count += 1
+			except (requests.ConnectionError, requests.Timeout) as e:
+				breaker.record_failure()
+
+				if attempt >= self.retry_policy.max_retries or not self.retry_policy.can_resend(idempotent, e):
+					raise
+
+				time.sleep(self.retry_policy.backoff(attempt))
+				attempt += 1
+				self._rewind_body(kwargs)
+				continue
+
+			# Update rate limit info
+			self.rate_limiter.update_from_response(response)
+
+			if response.status_code == 401 and not token_refreshed:
+				token_refreshed = True
+
+				# Token expired, try refresh
+				if self.refresh_token():
+					headers.update(self._get_auth_headers())
+					self._update_token_params(kwargs)
+					self._rewind_body(kwargs)
+					continue
+
+			if response.status_code >= 500:
+				breaker.record_failure()
+			else:
+				breaker.record_success()
+
+			if attempt < self.retry_policy.max_retries and self.retry_policy.should_retry(idempotent, response):
+				time.sleep(self.retry_policy.backoff(attempt))
+				attempt += 1
+				self._rewind_body(kwargs)
+				continue
+
+			return response
+
+	def iter_pages(self, url, params=None, max_pages=None, cursor=None) -> Iterator[list[dict]]:
+		"""Yield pages of a cursor-paginated Graph edge, following paging.next
+
+		cursor is a dict updated in place: "after" points past the last page the
+		caller has finished with, "done" is set once the edge is exhausted. Pass
+		the same dict back to resume an interrupted listing.
+		"""
+		cursor = cursor if cursor is not None else {}
+		params = dict(params or {})
+
+		if cursor.get("after"):
+			params["after"] = cursor["after"]
+
+		pages = 0
+
+		while url:
+			response = self.make_request("GET", url, params=params)
+
+			if response.status_code != 200:
+				self.fetch_errors[url.split("?")[0]] = response.text
+				return
+
+			data = response.json()
+			yield data.get("data", [])
+
+			# The caller came back for more, so the page above is fully consumed
+			pages += 1
+			paging = data.get("paging", {})
+			cursor["after"] = paging.get("cursors", {}).get("after")
+
+			# The next link already carries the query string
+			url = paging.get("next")
+			params = None
+
+			if max_pages and pages >= max_pages and url:
+				return
+
+		cursor["done"] = True
+
+	def paginate(self, url, params=None, max_items=None, max_pages=None, cursor=None) -> Iterator[dict]:
+		"""Lazily yield the items of a cursor-paginated Graph edge"""
+		items = (
+			item
+			for page in self.iter_pages(url, params=params, max_pages=max_pages, cursor=cursor)
+			for item in page
+		)
+		yield from islice(items, max_items)
+
+	def _update_token_params(self, kwargs):
+		"""Swap a refreshed access token into the auth headers and query / form parameters"""
+		kwargs["headers"].update(self._get_auth_headers())
+
+		for key in ("params", "data", "json"):
+			values = kwargs.get(key)
+			if isinstance(values, dict) and "access_token" in values:
+				values["access_token"] = self.account.get_access_token()
+
+	@staticmethod
+	def _rewind_body(kwargs):
+		"""Rewind a streamed request body before it is sent again"""
+		body = kwargs.get("data")
+		if hasattr(body, "seek"):
+			body.seek(0)
+
 	@abstractmethod
 	def _get_auth_headers(self) -> Dict[str, str]:
 		"""Get authentication headers"""
 		pass
 
 
+class CircuitOpenError(Exception):
+	"""Raised instead of calling an endpoint that keeps failing"""
+	pass
+
+
+class RateLimitExceeded(Exception):
+	"""Raised when a rate limit bucket stays empty or blocked longer than a caller may wait"""
+	pass
+
+
+# Graph rate limiting errors, rejected before the call had any effect
+THROTTLING_ERROR_CODES = frozenset({4, 17, 32, 613, 80001, 80002, 80004, 80005, 80006, 80008, 80014, 130429})
+
+
+class RetryPolicy:
+	"""Decides which failed calls are retried and how long to back off"""
+
+	# Graph errors that clear up by themselves: temporary service errors and throttling
+	TRANSIENT_ERROR_CODES = frozenset({1, 2, 341, *THROTTLING_ERROR_CODES})
+	TRANSIENT_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+	# Methods Graph can safely receive twice
+	IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "DELETE"})
+
+	def __init__(self):
+		self.max_retries = get_setting("retry_max_retries")
+		self.base_delay = get_setting("retry_base_delay")
+		self.max_delay = get_setting("retry_max_delay")
+
+	def is_transient(self, response) -> bool:
+		"""Whether a failed response is worth sending again"""
+		if response.status_code in self.TRANSIENT_STATUS_CODES:
+			return True
+
+		if response.status_code < 400:
+			return False
+
+		try:
+			error = response.json().get("error") or {}
+		except ValueError:
+			return False
+
+		return error.get("code") in self.TRANSIENT_ERROR_CODES or bool(error.get("is_transient"))
+
+	def is_throttled(self, response) -> bool:
+		"""Whether Graph refused a call for rate limiting, without acting on it"""
+		if response.status_code == 429:
+			return True
+
+		try:
+			return (response.json().get("error") or {}).get("code") in THROTTLING_ERROR_CODES
+		except ValueError:
+			return False
+
+	def should_retry(self, idempotent, response) -> bool:
+		"""Transient failures are retried, for non-idempotent calls only throttling"""
+		if idempotent:
+			return self.is_transient(response)
+
+		return self.is_throttled(response)
+
+	def can_resend(self, idempotent, error) -> bool:
+		"""Whether a call that raised may go out again
+
+		A read timeout or a dropped connection ("Connection aborted") on a POST may
+		come after Graph already acted on it; only failures to open a connection
+		are known not to have reached it.
+		"""
+		if idempotent or isinstance(error, requests.ConnectTimeout):
+			return True
+
+		# requests wraps urllib3's error in MaxRetryError, whose reason is the cause
+		reason = getattr(error.args[0], "reason", None) if error.args else None
+		return isinstance(reason, NewConnectionError)
+
+	def backoff(self, attempt) -> float:
+		"""Capped exponential backoff with full jitter"""
+		return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+	"""Per host/page circuit breaker shared by all workers through Redis
+
+	After too many server errors within the window the circuit opens and calls
+	fail fast. Once the cooldown has passed a single trial call is let through,
+	its success closes the circuit again.
+	"""
+
+	def __init__(self, name):
+		self.name = name
+		self.redis_key = f"circuit:{name}"
+
+	def allow(self) -> bool:
+		"""Whether a call may go out now"""
+		try:
+			# Raw pipeline commands, the cache wrapper would pickle hash values
+			cache = frappe.cache()
+			pipe = cache.pipeline()
+			pipe.hget(cache.make_key(self.redis_key), "opened_until")
+			opened_until = float(pipe.execute()[0] or 0)
+
+			if not opened_until:
+				return True
+
+			if opened_until > time.time():
+				return False
+
+			# Half open, only one caller gets to probe the endpoint
+			pipe = cache.pipeline()
+			pipe.set(cache.make_key(f"{self.redis_key}:trial"), 1, nx=True, ex=get_setting("circuit_cooldown"))
+			return bool(pipe.execute()[0])
+		except Exception:
+			return True
+
+	def record_success(self):
+		try:
+			cache = frappe.cache()
+			pipe = cache.pipeline()
+			pipe.delete(cache.make_key(self.redis_key), cache.make_key(f"{self.redis_key}:trial"))
+			pipe.execute()
+		except Exception:
+			pass
+
+	def record_failure(self):
+		try:
+			cache = frappe.cache()
+			key = cache.make_key(self.redis_key)
+			window = get_setting("circuit_window")
+
+			pipe = cache.pipeline()
+			pipe.hincrby(key, "failures", 1)
+			pipe.expire(key, window)
+			failures = pipe.execute()[0]
+
+			if failures >= get_setting("circuit_failure_threshold"):
+				cooldown = get_setting("circuit_cooldown")
+
+				pipe = cache.pipeline()
+				pipe.hset(key, "opened_until", time.time() + cooldown)
+				# Keep the open state around for the whole cooldown
+				pipe.expire(key, window + cooldown)
+				pipe.delete(cache.make_key(f"{self.redis_key}:trial"))
+				pipe.execute()
+		except Exception:
+			pass
+
+
 class RateLimiter:
-	"""Rate limiting manager"""
-	
-	def __init__(self, platform):
+	"""Distributed token bucket rate limiter shared by all workers through Redis
+
+	One bucket is kept per app, page and WhatsApp phone number. Buckets are
+	slowed down or blocked from the Graph usage headers of every response.
+	"""
+
+	# Refill the bucket and take a token; returns seconds to wait (0 if a token was taken).
+	# Time comes from Redis so buckets shared across hosts see one clock, a bucket
+	# without refill waits for the bucket TTL.
+	TAKE_TOKEN_SCRIPT = """
+	local capacity = tonumber(ARGV[1])
+	local rate = tonumber(ARGV[2])
+	local clock = redis.call('TIME')
+	local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+	local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'factor', 'blocked_until')
+	local blocked_until = tonumber(bucket[4]) or 0
+	if blocked_until > now then
+		return tostring(blocked_until - now)
+	end
+	rate = rate * (tonumber(bucket[3]) or 1)
+	local tokens = tonumber(bucket[1]) or capacity
+	local ts = tonumber(bucket[2]) or now
+	tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+	local wait = 0
+	if tokens >= 1 then
+		tokens = tokens - 1
+	elseif rate > 0 then
+		wait = (1 - tokens) / rate
+	else
+		wait = tonumber(ARGV[3])
+	end
+	redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+	redis.call('EXPIRE', KEYS[1], ARGV[3])
+	return tostring(wait)
+	"""
+
+	# Slowest refill rate (as a fraction of the configured rate) under heavy usage
+	MIN_FACTOR = 0.1
+	BUCKET_TTL = 3600
+
+	def __init__(self, platform, app_id=None, page_id=None, phone_number_id=None):
 		self.platform = platform
 		self.redis_key = f"rate_limit:{platform}"
-	
+
+		self.buckets = {}
+		for scope, scope_id in (("app", app_id), ("page", page_id), ("phone", phone_number_id)):
+			if scope_id:
+				self.buckets[scope] = f"{self.redis_key}:{scope}:{scope_id}"
+
+		self.scope_ids = {"app": app_id, "page": page_id, "phone": phone_number_id}
+
 	def wait_if_needed(self):
-		"""Wait if rate limit exceeded"""
-		# Simple implementation - can be enhanced with Redis
-		pass
-	
+		"""Block until every bucket of this caller has a token available
+
+		Waits rate_limit_max_wait seconds at most. A wait that would go past it
+		raises RateLimitExceeded right away, without sleeping, so the caller can
+		defer or requeue its work instead of sending anyway.
+		"""
+		max_wait = get_setting("rate_limit_max_wait")
+		waited = 0
+
+		for scope, key in self.buckets.items():
+			limits = get_setting("rate_limits").get(scope, {})
+
+			while True:
+				wait = self._take_token(key, limits)
+				if not wait:
+					break
+
+				if waited + wait > max_wait:
+					# Sleeping would not get a token within the budget, hand the wait back now
+					raise RateLimitExceeded(f"{key} is rate limited for another {wait:.0f}s")
+
+				time.sleep(wait)
+				waited += wait
+
 	def update_from_response(self, response):
-		"""Update rate limit info from API response"""
-		# Extract rate limit headers and update Redis
-		pass
\ No newline at end of file
+		"""Feed Graph usage headers back into the shared buckets"""
+		headers = response.headers
+
+		retry_after = self._parse_retry_after(headers.get("Retry-After"))
+		if retry_after:
+			for key in self.buckets.values():
+				self._update_bucket(key, blocked_for=retry_after)
+
+		# App level usage, percentages of the app's hourly quota
+		app_usage = self._parse_json_header(headers.get("X-App-Usage"))
+		if app_usage and "app" in self.buckets:
+			self._update_bucket(self.buckets["app"], **self._throttle_from_usage(app_usage))
+
+		# Business use case usage, keyed by the page / WhatsApp business object
+		buc_usage = self._parse_json_header(headers.get("X-Business-Use-Case-Usage")) or {}
+		owner_keys = [key for scope, key in self.buckets.items() if scope != "app"]
+
+		for object_id, usages in buc_usage.items():
+			keys = [
+				key for scope, key in self.buckets.items()
+				if scope != "app" and self.scope_ids.get(scope) == object_id
+			] or owner_keys
+
+			for usage in usages if isinstance(usages, list) else [usages]:
+				for key in keys:
+					self._update_bucket(key, **self._throttle_from_usage(usage))
+
+	def _take_token(self, key, limits) -> float:
+		"""Take a token from a bucket, returns seconds to wait when empty"""
+		try:
+			cache = frappe.cache()
+			wait = cache.eval(
+				self.TAKE_TOKEN_SCRIPT,
+				1,
+				cache.make_key(key),
+				limits.get("capacity", 50),
+				limits.get("refill_rate", 5),
+				self.BUCKET_TTL
+			)
+			return float(wait)
+		except Exception:
+			# Fail open, an unavailable Redis must not stop API traffic
+			return 0
+
+	def _update_bucket(self, key, factor=None, blocked_for=None):
+		"""Store throttle factor and block window for a bucket"""
+		values = {}
+
+		if factor is not None:
+			values["factor"] = factor
+
+		if not (values or blocked_for):
+			return
+
+		try:
+			cache = frappe.cache()
+
+			if blocked_for:
+				# Same clock as the token script
+				seconds, microseconds = cache.time()
+				values["blocked_until"] = seconds + microseconds / 1e6 + blocked_for
+
+			redis_key = cache.make_key(key)
+			pipe = cache.pipeline()
+			pipe.hset(redis_key, mapping=values)
+			pipe.expire(redis_key, self.BUCKET_TTL)
+			pipe.execute()
+		except Exception:
+			pass
+
+	def _throttle_from_usage(self, usage) -> dict[str, Any]:
+		"""Translate a Graph usage object into a refill factor and block window"""
+		percent = max(
+			[usage.get(metric) or 0 for metric in ("call_count", "total_cputime", "total_time")]
+		)
+
+		# Full speed below 50% usage, then slow down linearly towards the limit
+		factor = 1 if percent < 50 else max(self.MIN_FACTOR, (100 - percent) / 50)
+
+		blocked_for = None
+		regain_minutes = usage.get("estimated_time_to_regain_access")
+		if regain_minutes:
+			blocked_for = regain_minutes * 60
+		elif percent >= 100:
+			blocked_for = get_setting("rate_limit_block_seconds")
+
+		return {"factor": factor, "blocked_for": blocked_for}
+
+	@staticmethod
+	def _parse_json_header(value):
+		"""Parse JSON encoded usage header"""
+		if not value:
+			return None
+
+		try:
+			return json.loads(value)
+		except ValueError:
+			return None
+
+	@staticmethod
+	def _parse_retry_after(value) -> float | None:
+		"""Parse Retry-After header given in seconds or as an HTTP date"""
+		if not value:
+			return None
+
+		try:
+			return max(0, float(value))
+		except ValueError:
+			pass
+
+		try:
+			return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+		except (TypeError, ValueError):
+			return None
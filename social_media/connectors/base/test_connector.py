@@ -0,0 +1,206 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+import time
+from http.client import RemoteDisconnected
+from unittest.mock import Mock, patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from social_media.connectors.base.connector import (
+	CircuitBreaker,
+	CircuitOpenError,
+	RateLimiter,
+	RateLimitExceeded,
+	RetryPolicy,
+)
+from social_media.connectors.meta.facebook import FacebookConnector
+from social_media.tests.utils import make_response, make_test_account
+
+EDGE_URL = "https://graph.facebook.com/v18.0/_test_fb_page/conversations"
+
+
+def make_page(items, after, next_url=None):
+	return make_response(
+		data={
+			"data": items,
+			"paging": {"cursors": {"after": after}, **({"next": next_url} if next_url else {})},
+		}
+	)
+
+
+class TestPagination(FrappeTestCase):
+	def setUp(self):
+		self.connector = FacebookConnector(make_test_account())
+
+	def test_interrupted_listing_resumes_after_the_last_consumed_page(self):
+		cursor = {}
+		with patch.object(
+			self.connector, "make_request", return_value=make_page([1, 2], "c1", f"{EDGE_URL}?after=c1")
+		):
+			self.assertEqual(list(self.connector.paginate(EDGE_URL, max_pages=1, cursor=cursor)), [1, 2])
+
+		self.assertEqual(cursor, {"after": "c1"})
+
+		with patch.object(self.connector, "make_request", return_value=make_page([3], "c2")) as request:
+			self.assertEqual(list(self.connector.paginate(EDGE_URL, cursor=cursor)), [3])
+
+		self.assertEqual(request.call_args.kwargs["params"]["after"], "c1")
+		self.assertTrue(cursor["done"])
+
+	def test_budget_stop_inside_a_page_keeps_it_unconsumed(self):
+		cursor = {}
+		with patch.object(self.connector, "make_request", return_value=make_page([1, 2, 3], "c1")):
+			self.assertEqual(list(self.connector.paginate(EDGE_URL, max_items=2, cursor=cursor)), [1, 2])
+
+		self.assertEqual(cursor, {})
+
+	def test_failed_page_leaves_the_listing_unfinished(self):
+		cursor = {}
+		with patch.object(self.connector, "make_request", return_value=make_response(500, {"error": "boom"})):
+			self.assertEqual(list(self.connector.paginate(EDGE_URL, cursor=cursor)), [])
+
+		self.assertNotIn("done", cursor)
+		self.assertIn(EDGE_URL, self.connector.fetch_errors)
+
+
+class TestRateLimiter(FrappeTestCase):
+	def setUp(self):
+		self.limiter = RateLimiter("Facebook", page_id=frappe.generate_hash())
+		self.bucket = self.limiter.buckets["page"]
+
+	def test_bucket_hands_out_capacity_then_asks_to_wait(self):
+		limits = {"capacity": 2, "refill_rate": 1}
+
+		waits = [self.limiter._take_token(self.bucket, limits) for _ in range(3)]
+
+		self.assertEqual(waits[:2], [0, 0])
+		self.assertGreater(waits[2], 0)
+		self.assertLessEqual(waits[2], 1)
+
+	def test_bucket_without_refill_does_not_fail(self):
+		limits = {"capacity": 1, "refill_rate": 0}
+
+		self.assertEqual(self.limiter._take_token(self.bucket, limits), 0)
+		self.assertEqual(self.limiter._take_token(self.bucket, limits), RateLimiter.BUCKET_TTL)
+
+	@patch.dict(frappe.conf, {"social_media_rate_limit_max_wait": 2})
+	@patch("social_media.connectors.base.connector.time.sleep")
+	def test_blocked_bucket_raises_without_waiting(self, sleep):
+		self.limiter._update_bucket(self.bucket, blocked_for=300)
+
+		with self.assertRaises(RateLimitExceeded):
+			self.limiter.wait_if_needed()
+
+		sleep.assert_not_called()
+
+
+@patch("social_media.connectors.base.connector.time.sleep")
+@patch("social_media.connectors.base.transport.request")
+class TestRetries(FrappeTestCase):
+	def setUp(self):
+		self.connector = FacebookConnector(make_test_account())
+		self.connector.rate_limiter = Mock()
+		self.breaker = CircuitBreaker(f"graph.facebook.com:{self.connector.channel.account_id}")
+		self.breaker.record_success()
+
+	def test_reads_are_retried_on_transient_errors(self, request, sleep):
+		request.side_effect = [make_response(503), make_response(200, {"id": "1"})]
+
+		self.assertEqual(self.connector.make_request("GET", EDGE_URL).status_code, 200)
+		self.assertEqual(request.call_count, 2)
+		self.assertEqual(sleep.call_count, 1)
+
+	def test_posts_are_not_sent_twice_after_a_lost_response(self, request, sleep):
+		request.side_effect = requests.ReadTimeout()
+		with self.assertRaises(requests.ReadTimeout):
+			self.connector.make_request("POST", EDGE_URL)
+
+		request.side_effect = [make_response(500)]
+		self.assertEqual(self.connector.make_request("POST", EDGE_URL).status_code, 500)
+		self.assertEqual(request.call_count, 2)
+
+	def test_posts_are_not_resent_after_a_dropped_connection(self, request, sleep):
+		request.side_effect = requests.ConnectionError(
+			ProtocolError("Connection aborted.", RemoteDisconnected("Remote end closed connection"))
+		)
+
+		with self.assertRaises(requests.ConnectionError):
+			self.connector.make_request("POST", EDGE_URL)
+
+		self.assertEqual(request.call_count, 1)
+
+	def test_batched_reads_are_retried_on_transient_errors(self, request, sleep):
+		request.side_effect = [make_response(503), make_response(200, [])]
+
+		self.assertEqual(
+			self.connector._batch_request([{"method": "GET", "relative_url": "t_1/messages"}]), []
+		)
+		self.assertEqual(request.call_count, 2)
+
+	def test_posts_are_retried_when_they_never_arrived_or_were_throttled(self, request, sleep):
+		request.side_effect = [
+			requests.ConnectTimeout(),
+			requests.ConnectionError(
+				MaxRetryError(None, EDGE_URL, NewConnectionError(None, "Connection refused"))
+			),
+			make_response(400, {"error": {"code": 613}}),
+			make_response(200, {"id": "1"}),
+		]
+
+		self.assertEqual(self.connector.make_request("POST", EDGE_URL).status_code, 200)
+		self.assertEqual(request.call_count, 4)
+
+	@patch.dict(
+		frappe.conf, {"social_media_circuit_failure_threshold": 2, "social_media_retry_max_retries": 5}
+	)
+	def test_retries_stop_once_the_circuit_opens(self, request, sleep):
+		request.return_value = make_response(503)
+
+		with self.assertRaises(CircuitOpenError):
+			self.connector.make_request("GET", EDGE_URL)
+
+		self.assertEqual(request.call_count, 2)
+
+
+class TestRetryPolicy(FrappeTestCase):
+	def test_transient_classification(self):
+		policy = RetryPolicy()
+
+		self.assertTrue(policy.is_transient(make_response(502)))
+		self.assertTrue(policy.is_transient(make_response(400, {"error": {"code": 2}})))
+		self.assertTrue(
+			policy.is_transient(make_response(400, {"error": {"code": 100, "is_transient": True}}))
+		)
+		self.assertFalse(policy.is_transient(make_response(400, {"error": {"code": 100}})))
+		self.assertFalse(policy.should_retry(False, make_response(503)))
+		self.assertTrue(policy.should_retry(False, make_response(429)))
+
+	@patch.dict(frappe.conf, {"social_media_retry_base_delay": 1, "social_media_retry_max_delay": 5})
+	def test_backoff_grows_and_is_capped(self):
+		policy = RetryPolicy()
+
+		with patch(
+			"social_media.connectors.base.connector.random.uniform", side_effect=lambda low, high: high
+		):
+			self.assertEqual([policy.backoff(attempt) for attempt in range(5)], [1, 2, 4, 5, 5])
+
+
+class TestCircuitBreaker(FrappeTestCase):
+	@patch.dict(
+		frappe.conf, {"social_media_circuit_failure_threshold": 1, "social_media_circuit_cooldown": 30}
+	)
+	def test_open_circuit_lets_one_trial_through_after_cooldown(self):
+		breaker = CircuitBreaker(frappe.generate_hash())
+		breaker.record_failure()
+		self.assertFalse(breaker.allow())
+
+		with patch("social_media.connectors.base.connector.time.time", return_value=time.time() + 31):
+			self.assertTrue(breaker.allow())
+			self.assertFalse(breaker.allow())
+
+		breaker.record_success()
+		self.assertTrue(breaker.allow())
@@ -0,0 +1,68 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.connectors.base import transport
+
+
+class StubGraphHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	disable_nagle_algorithm = True
+
+	def setup(self):
+		super().setup()
+		self.server.connections += 1
+
+	def do_GET(self):
+		body = b'{"data": []}'
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class TestTransport(FrappeTestCase):
+	CALLS = 50
+
+	def setUp(self):
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubGraphHandler)
+		self.server.connections = 0
+		self.url = f"http://127.0.0.1:{self.server.server_port}/v18.0/me"
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		transport.close_sessions()
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		transport.close_sessions()
+
+	def _send(self, send):
+		for _ in range(self.CALLS):
+			self.assertEqual(send("GET", self.url).status_code, 200)
+
+	def test_session_is_shared_per_host(self):
+		self.assertIs(transport.get_session(self.url), transport.get_session(self.url + "/accounts"))
+
+	def test_connection_reuse(self):
+		self._send(requests.request)
+		self.assertEqual(self.server.connections, self.CALLS)
+
+		self.server.connections = 0
+		adapter = transport.get_session(self.url).get_adapter(self.url)
+		pool = adapter.poolmanager.connection_from_url(self.url)
+
+		self._send(transport.request)
+
+		# Every call went through the same adapter and pool, over one connection
+		self.assertIs(transport.get_session(self.url).get_adapter(self.url), adapter)
+		self.assertIs(adapter.poolmanager.connection_from_url(self.url), pool)
+		self.assertEqual(self.server.connections, 1)
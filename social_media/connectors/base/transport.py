@@ -0,0 +1,144 @@
+import io
+import os
+import threading
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from social_media.config import get_setting
+
+# One pooled session per platform host, shared by every connector in the process
+_sessions = {}
+_lock = threading.Lock()
+
+
+def get_session(url) -> requests.Session:
+	"""Get the shared keep-alive session for the host of the given URL"""
+	host = urlsplit(url).netloc
+
+	session = _sessions.get(host)
+	if session:
+		return session
+
+	with _lock:
+		session = _sessions.get(host)
+		if not session:
+			session = _build_session(host)
+			_sessions[host] = session
+
+	return session
+
+
+def _build_session(host) -> requests.Session:
+	"""Create a session with a connection pool sized for the host"""
+	pool = get_setting("http_pools").get(host, {})
+
+	adapter = HTTPAdapter(
+		pool_connections=pool.get("pool_connections", get_setting("http_pool_connections")),
+		pool_maxsize=pool.get("pool_maxsize", get_setting("http_pool_maxsize")),
+		pool_block=pool.get("pool_block", False),
+		# Retries are handled by the connectors, not by urllib3
+		max_retries=0,
+	)
+
+	session = requests.Session()
+	session.mount("https://", adapter)
+	session.mount("http://", adapter)
+
+	return session
+
+
+def get_timeout(host=None):
+	"""Get (connect, read) timeout for a host"""
+	timeout = get_setting("http_pools").get(host, {}).get("timeout") or get_setting("http_timeout")
+	return tuple(timeout) if isinstance(timeout, list | tuple) else timeout
+
+
+def request(method, url, **kwargs) -> requests.Response:
+	"""Send a request through the shared session for the URL's host"""
+	kwargs.setdefault("timeout", get_timeout(urlsplit(url).netloc))
+	return get_session(url).request(method, url, **kwargs)
+
+
+def close_sessions():
+	"""Close all pooled sessions (used when workers fork or in tests)"""
+	with _lock:
+		for session in _sessions.values():
+			session.close()
+		_sessions.clear()
+
+
+class MultipartFile:
+	"""multipart/form-data body that streams a single file from disk
+
+	requests sends file-like bodies with a known length block by block,
+	so uploads never load the whole file into memory.
+	"""
+
+	def __init__(self, fields, file_field, path, file_name, content_type):
+		self.boundary = uuid.uuid4().hex
+		self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+		head = b"".join(
+			self._part_header(name) + str(value).encode() + b"\r\n" for name, value in fields.items()
+		)
+		head += self._part_header(file_field, file_name, content_type)
+		tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+		self._file = open(path, "rb")
+		self._parts = [io.BytesIO(head), self._file, io.BytesIO(tail)]
+		self._index = 0
+		self.len = len(head) + os.path.getsize(path) + len(tail)
+
+	def _part_header(self, name, file_name=None, content_type=None) -> bytes:
+		disposition = f'form-data; name="{name}"'
+		header = f"--{self.boundary}\r\n"
+
+		if file_name:
+			disposition += f'; filename="{file_name}"'
+			header += f"Content-Disposition: {disposition}\r\nContent-Type: {content_type}\r\n\r\n"
+		else:
+			header += f"Content-Disposition: {disposition}\r\n\r\n"
+
+		return header.encode()
+
+	def __len__(self):
+		return self.len
+
+	def read(self, size=-1) -> bytes:
+		chunks = []
+
+		while self._index < len(self._parts) and size != 0:
+			chunk = self._parts[self._index].read(size)
+
+			if not chunk:
+				self._index += 1
+				continue
+
+			chunks.append(chunk)
+			if size > 0:
+				size -= len(chunk)
+
+		return b"".join(chunks)
+
+	def seek(self, offset, whence=os.SEEK_SET):
+		"""Rewind the body so a request can be re-sent"""
+		if offset != 0 or whence != os.SEEK_SET:
+			raise io.UnsupportedOperation("MultipartFile can only be rewound to the start")
+
+		for part in self._parts:
+			part.seek(0)
+
+		self._index = 0
+		return 0
+
+	def close(self):
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
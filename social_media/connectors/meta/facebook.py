@@ -1,43 +1,62 @@
+import json
+import mimetypes
+import os
+from collections.abc import Iterator
+from itertools import chain, islice
+from typing import Any, Dict, List
+
 import frappe
+
+from social_media.config import get_setting
+from social_media.connectors.base import transport
 from social_media.connectors.base.connector import BaseConnector
-from typing import Dict, List, Any
-import json
+from social_media.connectors.base.transport import MultipartFile
+from social_media.utils import chunked, run_concurrently
+from social_media.utils.credentials import invalidate_credentials
+from social_media.utils.ingestion import ingest_messages, to_system_datetime
+from social_media.utils.sync_watermarks import get_conversation_watermarks, has_new_activity, is_synced
 
 
 class FacebookConnector(BaseConnector):
 	"""Facebook Graph API connector"""
-	
+
 	BASE_URL = "https://graph.facebook.com/v18.0"
-	
+
+	# Graph API accepts at most 50 sub-requests per batch call
+	BATCH_SIZE = 50
+	MESSAGE_FIELDS = "id,created_time,from,to,message,attachments"
+
 	def publish_post(self, post_doc) -> Dict[str, Any]:
 		"""Publish post to Facebook page"""
 		try:
-			# Upload media first if attachments exist
-			media_ids = []
-			for attachment in post_doc.attachments:
-				if attachment.attachment_type in ["Image", "Video"]:
-					media_id = self._upload_media(attachment)
-					if media_id:
-						media_ids.append(media_id)
-			
+			# Upload media first if attachments exist, all attachments in parallel
+			media = [
+				self._resolve_media(attachment)
+				for attachment in post_doc.attachments
+				if attachment.attachment_type in ["Image", "Video"]
+			]
+
+			uploaded = run_concurrently(self._upload_media, media, get_setting("media_upload_concurrency"))
+			media_ids = [media_id for media_id in uploaded if media_id]
+
 			# Create post payload
 			payload = {
 				"message": post_doc.content,
-				"access_token": self.account.get_password("oauth_access_token")
+				"access_token": self.account.get_access_token()
 			}
-			
+
 			if media_ids:
 				if len(media_ids) == 1:
 					payload["object_attachment"] = media_ids[0]
 				else:
 					payload["attached_media"] = [{"media_fbid": mid} for mid in media_ids]
-			
+
 			# Publish to page
 			page_id = self.channel.account_id
 			url = f"{self.BASE_URL}/{page_id}/feed"
-			
+
 			response = self.make_request("POST", url, json=payload)
-			
+
 			if response.status_code == 200:
 				data = response.json()
 				return {
@@ -50,11 +69,11 @@ class FacebookConnector(BaseConnector):
 					"success": False,
 					"error": response.text
 				}
-				
+
 		except Exception as e:
 			frappe.log_error(f"Facebook publish error: {str(e)}")
 			return {"success": False, "error": str(e)}
-	
+
 	def schedule_post(self, post_doc, scheduled_time) -> Dict[str, Any]:
 		"""Schedule Facebook post"""
 		# Facebook doesn't support native scheduling via API
@@ -66,65 +85,123 @@ class FacebookConnector(BaseConnector):
 			at_time=scheduled_time
 		)
 		return {"success": True, "scheduled": True}
-	
+
 	def fetch_messages(self, since=None) -> List[Dict]:
 		"""Fetch page messages and comments"""
-		messages = []
-		
+		return list(self.iter_messages(since=since))
+
+	def iter_messages(self, since=None, max_items=None, max_pages=None, cursor=None) -> Iterator[dict]:
+		"""Lazily yield page messages, following conversation and message pagination
+
+		max_pages bounds the conversation pages read, max_items the messages yielded.
+		cursor is updated in place and can be passed back to resume the listing.
+		Conversations not updated since their watermark are skipped and the rest
+		are read only down to it; self.watermarks collects the new watermarks of
+		the conversations read to the end, to be saved once they are stored.
+		"""
+		self.fetch_errors = {}
+		self.watermarks = {}
+
 		try:
 			# Fetch page conversations
 			page_id = self.channel.account_id
 			url = f"{self.BASE_URL}/{page_id}/conversations"
-			
+
 			params = {
-				"access_token": self.account.get_password("oauth_access_token"),
+				"access_token": self.account.get_access_token(),
 				"fields": "id,updated_time,message_count,participants"
 			}
-			
+
 			if since:
 				params["since"] = since
-			
-			response = self.make_request("GET", url, params=params)
-			
-			if response.status_code == 200:
-				data = response.json()
-				for conversation in data.get("data", []):
-					# Fetch messages for each conversation
-					conv_messages = self._fetch_conversation_messages(conversation["id"])
-					messages.extend(conv_messages)
-			
-			return messages
-			
+
+			if get_setting("graph_batch_requests"):
+				# One batch call per page of 50 conversations instead of one call each
+				params["limit"] = self.BATCH_SIZE
+
+			pages = (
+				self._filter_changed_conversations(conversations)
+				for conversations in self.iter_pages(url, params=params, max_pages=max_pages, cursor=cursor)
+			)
+
+			if get_setting("graph_batch_requests"):
+				messages = (
+					message
+					for conversations in pages
+					for chunk in chunked(conversations, self.BATCH_SIZE)
+					for message in self._iter_messages_batched(chunk)
+				)
+			else:
+				messages = (
+					message
+					for conversations in pages
+					for conversation in conversations
+					for message in self._iter_new_messages(
+						self._iter_conversation_messages(conversation["id"]), conversation
+					)
+				)
+
+			yield from islice(messages, max_items)
+
 		except Exception as e:
 			frappe.log_error(f"Facebook fetch messages error: {str(e)}")
-			return []
-	
+
 	def process_webhook(self, event_data) -> Dict[str, Any]:
-		"""Process Facebook webhook event"""
+		"""Process every entry and change of a (batched) Facebook webhook delivery"""
 		try:
-			entry = event_data.get("entry", [{}])[0]
-			changes = entry.get("changes", [])
-			
-			for change in changes:
-				field = change.get("field")
-				value = change.get("value", {})
-				
-				if field == "messages":
-					self._process_message_event(value)
-				elif field == "feed":
-					self._process_feed_event(value)
-			
-			return {"success": True}
-			
+			outcomes = []
+			grouped = {}
+
+			# Group all changes of the delivery by page and field
+			for entry in event_data.get("entry") or []:
+				outcome = {"id": entry.get("id"), "changes": 0, "messages": 0, "errors": []}
+				outcomes.append(outcome)
+
+				# Messenger and Instagram messaging events
+				for event in entry.get("messaging") or []:
+					grouped.setdefault((entry.get("id"), "messages"), []).append((outcome, event))
+
+				for change in entry.get("changes") or []:
+					grouped.setdefault((entry.get("id"), change.get("field")), []).append(
+						(outcome, change.get("value") or {})
+					)
+
+			handlers = {
+				"messages": self._process_message_event,
+				"feed": self._process_feed_event
+			}
+
+			messages = []
+			for (_page_id, field), changes in grouped.items():
+				handler = handlers.get(field)
+
+				for outcome, value in changes:
+					outcome["changes"] += 1
+
+					if not handler:
+						continue
+
+					try:
+						change_messages = handler(value) or []
+						messages.extend(change_messages)
+						outcome["messages"] += len(change_messages)
+					except Exception as e:
+						outcome["errors"].append(f"{field}: {str(e)}")
+
+			# One bulk ingestion for all messages of the delivery
+			inserted = ingest_messages(messages, self.channel)
+
+			return {"success": True, "entries": outcomes, "inserted": inserted["messages"]}
+
 		except Exception as e:
 			frappe.log_error(f"Facebook webhook error: {str(e)}")
 			return {"success": False, "error": str(e)}
-	
+
 	def get_analytics(self, post_id=None, date_range=None) -> Dict[str, Any]:
 		"""Get Facebook page analytics"""
 		try:
 			page_id = self.channel.account_id
-			
+
 			if post_id:
 				# Get specific post insights
 				url = f"{self.BASE_URL}/{post_id}/insights"
@@ -133,26 +210,26 @@ class FacebookConnector(BaseConnector):
 				# Get page insights
 				url = f"{self.BASE_URL}/{page_id}/insights"
 				metrics = ["page_impressions", "page_engaged_users", "page_fans"]
-			
+
 			params = {
 				"metric": ",".join(metrics),
-				"access_token": self.account.get_password("oauth_access_token")
+				"access_token": self.account.get_access_token()
 			}
-			
+
 			if date_range:
 				params.update(date_range)
-			
+
 			response = self.make_request("GET", url, params=params)
-			
+
 			if response.status_code == 200:
 				return {"success": True, "data": response.json()}
 			else:
 				return {"success": False, "error": response.text}
-				
+
 		except Exception as e:
 			frappe.log_error(f"Facebook analytics error: {str(e)}")
 			return {"success": False, "error": str(e)}
-	
+
 	def _refresh_oauth_token(self) -> bool:
 		"""Refresh Facebook access token"""
 		try:
@@ -160,99 +237,260 @@ class FacebookConnector(BaseConnector):
 			params = {
 				"grant_type": "fb_exchange_token",
 				"client_id": self.account.app_id,
-				"client_secret": self.account.get_password("app_secret"),
-				"fb_exchange_token": self.account.get_password("oauth_access_token")
+				"client_secret": self.account.get_app_secret(),
+				"fb_exchange_token": self.account.get_access_token()
 			}
-			
-			response = requests.get(url, params=params)
-			
+
+			response = transport.request("GET", url, params=params)
+
 			if response.status_code == 200:
 				data = response.json()
 				self.account.oauth_access_token = data["access_token"]
 				self.account.expires_on = frappe.utils.add_days(frappe.utils.now(), 60)
 				self.account.save()
+
+				# on_update drops the cached token, make sure this process does too
+				invalidate_credentials(self.account.doctype, self.account.name)
 				return True
-			
+
 			return False
-			
+
 		except Exception as e:
 			frappe.log_error(f"Facebook token refresh error: {str(e)}")
 			return False
-	
+
 	def _get_auth_headers(self) -> Dict[str, str]:
 		"""Get Facebook auth headers"""
 		return {
-			"Authorization": f"Bearer {self.account.get_password('oauth_access_token')}"
+			"Authorization": f"Bearer {self.account.get_access_token()}"
+		}
+
+	def _resolve_media(self, attachment) -> dict[str, Any]:
+		"""Resolve a post attachment to a local file path, or a public URL for remote files"""
+		media = {
+			"attachment_type": attachment.attachment_type,
+			"file_url": attachment.file_url,
+			"file_name": attachment.file_name or os.path.basename(attachment.file_url or "")
 		}
-	
-	def _upload_media(self, attachment) -> str:
-		"""Upload media to Facebook"""
+
+		file_name = frappe.db.get_value("File", {"file_url": attachment.file_url}, "name")
+		if file_name:
+			media["path"] = frappe.get_doc("File", file_name).get_full_path()
+
+		return media
+
+	def _upload_media(self, media) -> str:
+		"""Upload media to Facebook as an unpublished photo or video, streamed from disk"""
 		try:
 			page_id = self.channel.account_id
-			url = f"{self.BASE_URL}/{page_id}/photos"
-			
-			files = {"source": ("image.jpg", attachment.file_url)}
-			data = {
-				"access_token": self.account.get_password("oauth_access_token"),
-				"published": "false"
-			}
-			
-			response = requests.post(url, files=files, data=data)
-			
+			edge = "videos" if media["attachment_type"] == "Video" else "photos"
+			url = f"{self.BASE_URL}/{page_id}/{edge}"
+
+			# The token goes in the query string, where a refresh-retry can swap it;
+			# a streamed body is already encoded
+			params = {"access_token": self.account.get_access_token()}
+			data = {"published": "false"}
+
+			if media.get("path"):
+				body = MultipartFile(
+					data,
+					"source",
+					media["path"],
+					media["file_name"],
+					mimetypes.guess_type(media["file_name"])[0] or "application/octet-stream"
+				)
+
+				with body:
+					response = self.make_request(
+						"POST", url, params=params, data=body, headers={"Content-Type": body.content_type}
+					)
+			else:
+				# Remote file, let Facebook fetch it
+				data["file_url" if edge == "videos" else "url"] = media["file_url"]
+				response = self.make_request("POST", url, params=params, data=data)
+
 			if response.status_code == 200:
 				return response.json().get("id")
-			
+
 			return None
-			
+
 		except Exception as e:
 			frappe.log_error(f"Facebook media upload error: {str(e)}")
 			return None
-	
-	def _fetch_conversation_messages(self, conversation_id) -> List[Dict]:
-		"""Fetch messages for a conversation"""
-		try:
-			url = f"{self.BASE_URL}/{conversation_id}/messages"
-			params = {
-				"access_token": self.account.get_password("oauth_access_token"),
-				"fields": "id,created_time,from,to,message,attachments"
+
+	def _filter_changed_conversations(self, conversations) -> list[dict]:
+		"""Drop conversations with no activity since their last sync, one lookup per page"""
+		watermarks = get_conversation_watermarks(self.channel.name, [c["id"] for c in conversations])
+
+		changed = []
+		for conversation in conversations:
+			conversation["watermark"] = watermarks.get(conversation["id"])
+			if has_new_activity(conversation, conversation["watermark"]):
+				changed.append(conversation)
+
+		return changed
+
+	def _iter_new_messages(self, messages, conversation) -> Iterator[dict]:
+		"""Yield the messages of a conversation newer than its watermark
+
+		Graph lists messages newest first, so reading stops (along with any
+		further paging) at the first message already synced.
+		"""
+		newest = None
+		failures = len(self.fetch_errors)
+
+		for message in self._tag_messages(messages, conversation):
+			if is_synced(message, conversation.get("watermark")):
+				break
+
+			newest = newest or message
+			yield message
+
+		# A failed page ends the listing quietly, leaving the conversation partly read
+		if len(self.fetch_errors) > failures:
+			return
+
+		# Only reached once the caller consumed the conversation to its end
+		self.watermarks[conversation["id"]] = {
+			"updated_time": conversation.get("updated_time") and to_system_datetime(conversation["updated_time"]),
+			"message_id": newest and newest.get("id"),
+			"message_time": newest and to_system_datetime(newest.get("created_time"))
+		}
+
+	def _iter_conversation_messages(self, conversation_id) -> Iterator[dict]:
+		"""Yield all messages of a conversation, newest first"""
+		url = f"{self.BASE_URL}/{conversation_id}/messages"
+		params = {
+			"access_token": self.account.get_access_token(),
+			"fields": self.MESSAGE_FIELDS
+		}
+
+		yield from self.paginate(url, params=params)
+
+	def _iter_messages_batched(self, conversations) -> Iterator[dict]:
+		"""Yield messages of up to BATCH_SIZE conversations fetched in one batch request"""
+		results = self._batch_request([
+			{"method": "GET", "relative_url": f"{conversation['id']}/messages?fields={self.MESSAGE_FIELDS}"}
+			for conversation in conversations
+		])
+
+		# Sub-responses come back in request order
+		for conversation, result in zip(conversations, results, strict=True):
+			if result.get("error"):
+				self.fetch_errors[conversation["id"]] = result["error"]
+				continue
+
+			# Older messages of long threads are read page by page, until the watermark
+			next_url = result["data"].get("paging", {}).get("next")
+			messages = chain(result["data"].get("data", []), self.paginate(next_url) if next_url else [])
+
+			yield from self._iter_new_messages(messages, conversation)
+
+	def _batch_request(self, batch) -> list[dict]:
+		"""Send up to BATCH_SIZE sub-requests in one call and split the responses per item"""
+		data = {
+			"access_token": self.account.get_access_token(),
+			"batch": json.dumps(batch),
+			"include_headers": "false"
+		}
+
+		# A batch of reads changes nothing, so it is retried like a GET
+		response = self.make_request(
+			"POST", f"{self.BASE_URL}/", idempotent=all(item["method"] == "GET" for item in batch), data=data
+		)
+
+		if response.status_code != 200:
+			return [{"error": response.text}] * len(batch)
+
+		results = []
+		for item in response.json():
+			# Graph returns null for sub-requests that did not complete in time
+			if not item:
+				results.append({"error": "Batch sub-request did not complete"})
+				continue
+
+			try:
+				body = json.loads(item.get("body") or "{}")
+			except ValueError:
+				body = {}
+
+			if item.get("code") == 200:
+				results.append({"data": body})
+			else:
+				error = body.get("error", {}).get("message") or item.get("body")
+				results.append({"error": f"HTTP {item.get('code')}: {error}"})
+
+		return results
+
+	def _tag_messages(self, messages, conversation) -> Iterator[dict]:
+		"""Attach the conversation a message belongs to"""
+		participants = ", ".join(
+			p.get("name") or p.get("id", "")
+			for p in conversation.get("participants", {}).get("data", [])
+		)
+
+		for message in messages:
+			message["conversation_id"] = conversation["id"]
+			message["participants"] = participants
+			yield message
+
+	def _process_message_event(self, value) -> list[dict]:
+		"""Turn an incoming message webhook into Graph style messages"""
+		# WhatsApp Cloud API changes carry a list of messages and their contacts
+		if "messages" in value:
+			contacts = {
+				contact.get("wa_id"): contact.get("profile", {}).get("name")
+				for contact in value.get("contacts") or []
 			}
-			
-			response = self.make_request("GET", url, params=params)
-			
-			if response.status_code == 200:
-				return response.json().get("data", [])
-			
-			return []
-			
-		except Exception as e:
-			frappe.log_error(f"Facebook conversation messages error: {str(e)}")
+
+			return [
+				{
+					"id": message.get("id"),
+					"from": {"id": message.get("from"), "name": contacts.get(message.get("from"))},
+					"created_time": message.get("timestamp"),
+					"message": (message.get("text") or {}).get("body"),
+					"message_type": message.get("type")
+				}
+				for message in value["messages"]
+			]
+
+		# Messenger / Instagram messaging event, delivery and read receipts carry no message
+		message = value.get("message")
+		if not message:
 			return []
-	
-	def _process_message_event(self, value):
-		"""Process incoming message webhook"""
-		# Create or update conversation and message records
-		pass
-	
-	def _process_feed_event(self, value):
+
+		attachments = message.get("attachments") or [{}]
+
+		return [{
+			"id": message.get("mid"),
+			"from": value.get("sender") or {},
+			"to": {"data": [value.get("recipient") or {}]},
+			"created_time": value.get("timestamp"),
+			"message": message.get("text"),
+			"message_type": attachments[0].get("type"),
+			"attachment_url": (attachments[0].get("payload") or {}).get("url")
+		}]
+
+	def _process_feed_event(self, value) -> list[dict]:
 		"""Process feed webhook (comments, reactions)"""
 		# Process comments and reactions on posts
-		pass
+		return []
 
 
 @frappe.whitelist()
 def publish_scheduled_post(post_id):
 	"""Background job to publish scheduled Facebook post"""
 	post_doc = frappe.get_doc("Social Post", post_id)
-	
+
 	# Get Facebook account for the post
 	for platform in post_doc.platforms:
 		if platform.channel and "Facebook" in platform.channel:
 			channel_doc = frappe.get_doc("Social Media Channel", platform.channel)
 			account_doc = frappe.get_doc("Social Account", {"channel": channel_doc.name})
-			
+
 			connector = FacebookConnector(account_doc)
 			result = connector.publish_post(post_doc)
-			
+
 			if result["success"]:
 				platform.status = "Published"
 				platform.platform_post_id = result["post_id"]
@@ -265,6 +503,6 @@ def publish_scheduled_post(post_id):
 				platform.error_message = result["error"]
 				post_doc.status = "Failed"
 				post_doc.error_log = result["error"]
-			
+
 			post_doc.save()
-			break
\ No newline at end of file
+			break
@@ -0,0 +1,151 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+import json
+import tempfile
+from unittest.mock import Mock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.connectors.base.connector import CircuitBreaker
+from social_media.connectors.meta.facebook import FacebookConnector
+from social_media.tests.utils import TEST_PAGE_ID, make_messaging_payload, make_response, make_test_account
+from social_media.utils.ingestion import ingest_messages
+from social_media.utils.sync_watermarks import save_conversation_watermarks
+
+
+def make_graph_message(minute, sender_id="psid-sync"):
+	return {
+		"id": frappe.generate_hash(),
+		"created_time": f"2025-01-01T10:{minute:02d}:00+0000",
+		"from": {"id": sender_id},
+		"to": {"data": [{"id": TEST_PAGE_ID}]},
+		"message": f"message at {minute}",
+	}
+
+
+class TestFacebookConnector(FrappeTestCase):
+	def setUp(self):
+		self.connector = FacebookConnector(make_test_account())
+
+	def test_process_webhook_handles_every_entry(self):
+		result = self.connector.process_webhook(make_messaging_payload(3, 2, prefix=frappe.generate_hash()))
+
+		self.assertTrue(result["success"])
+		self.assertEqual(result["inserted"], 6)
+		self.assertEqual([entry["messages"] for entry in result["entries"]], [2, 2, 2])
+
+	def test_process_webhook_queries_do_not_grow_with_events(self):
+		# Warm metadata and connection caches first
+		self.connector.process_webhook(make_messaging_payload(1, 1, prefix=frappe.generate_hash()))
+
+		def count_queries(payload):
+			with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+				result = self.connector.process_webhook(payload)
+			return result["inserted"], sql.call_count
+
+		small = count_queries(make_messaging_payload(2, 3, prefix=frappe.generate_hash()))
+		large = count_queries(make_messaging_payload(20, 50, prefix=frappe.generate_hash()))
+
+		self.assertEqual((small[0], large[0]), (6, 1000))
+		self.assertEqual(large[1], small[1])
+
+	def test_process_webhook_skips_replayed_events(self):
+		payload = make_messaging_payload(2, 3, prefix=frappe.generate_hash())
+
+		self.assertEqual(self.connector.process_webhook(payload)["inserted"], 6)
+		self.assertEqual(self.connector.process_webhook(payload)["inserted"], 0)
+
+	@patch.dict(frappe.conf, {"social_media_graph_batch_requests": 0})
+	def test_sync_reads_conversations_down_to_their_watermark(self):
+		conversation = {"id": frappe.generate_hash(), "updated_time": "2025-01-01T10:02:00+0000"}
+		thread = [make_graph_message(2), make_graph_message(1)]
+
+		def sync():
+			with (
+				patch.object(FacebookConnector, "iter_pages", return_value=iter([[dict(conversation)]])),
+				patch.object(
+					FacebookConnector, "_iter_conversation_messages", return_value=iter(list(thread))
+				) as fetch,
+			):
+				messages = list(self.connector.iter_messages())
+
+			ingest_messages(messages, self.connector.channel)
+			save_conversation_watermarks(self.connector.channel.name, self.connector.watermarks)
+			return messages, fetch.call_count
+
+		self.assertEqual(len(sync()[0]), 2)
+
+		# Nothing changed on the platform, the thread is not read at all
+		self.assertEqual(sync(), ([], 0))
+
+		# One new message, reading stops at the previously newest one
+		conversation["updated_time"] = "2025-01-01T10:03:00+0000"
+		thread.insert(0, make_graph_message(3))
+		messages, calls = sync()
+
+		self.assertEqual(calls, 1)
+		self.assertEqual([m["id"] for m in messages], [thread[0]["id"]])
+
+	def test_batched_messages_follow_paging_and_isolate_failed_items(self):
+		conversations = [{"id": f"t_batch_{i}", "updated_time": "2025-01-01T10:05:00+0000"} for i in range(3)]
+		newest, older = make_graph_message(5), make_graph_message(4)
+		next_url = "https://graph.facebook.com/v18.0/t_batch_0/messages?after=c1"
+
+		batch = make_response(
+			data=[
+				{"code": 200, "body": json.dumps({"data": [newest], "paging": {"next": next_url}})},
+				{"code": 400, "body": json.dumps({"error": {"message": "Unsupported get request"}})},
+				None,
+			]
+		)
+		responses = {"POST": batch, "GET": make_response(data={"data": [older], "paging": {}})}
+
+		with patch.object(
+			self.connector, "make_request", side_effect=lambda method, url, **kwargs: responses[method]
+		) as request:
+			messages = list(self.connector._iter_messages_batched(conversations))
+
+		# The first thread is read on through its next page, the failed items are skipped
+		self.assertEqual([m["id"] for m in messages], [newest["id"], older["id"]])
+		self.assertEqual(request.call_args_list[1].args, ("GET", next_url))
+		self.assertEqual(set(self.connector.fetch_errors), {"t_batch_1", "t_batch_2"})
+		self.assertIn("Unsupported get request", self.connector.fetch_errors["t_batch_1"])
+
+		# Only the thread read to its end gets a watermark
+		self.assertEqual(set(self.connector.watermarks), {"t_batch_0"})
+		self.assertEqual(self.connector.watermarks["t_batch_0"]["message_id"], newest["id"])
+
+	@patch("social_media.connectors.base.transport.request")
+	def test_streamed_upload_is_resent_with_the_refreshed_token(self, request):
+		sent = []
+
+		def respond(method, url, **kwargs):
+			sent.append((dict(kwargs["params"]), kwargs["headers"]["Authorization"], kwargs["data"].read()))
+			return make_response(401) if len(sent) == 1 else make_response(200, {"id": "_media"})
+
+		request.side_effect = respond
+		self.connector.rate_limiter = Mock()
+		CircuitBreaker(f"graph.facebook.com:{self.connector.channel.account_id}").record_success()
+		self.connector.account.get_access_token = Mock(side_effect=["stale", "stale", "fresh", "fresh"])
+
+		with tempfile.NamedTemporaryFile(suffix=".jpg") as media_file:
+			media_file.write(b"image bytes")
+			media_file.flush()
+
+			with patch.object(self.connector, "refresh_token", return_value=True):
+				media_id = self.connector._upload_media(
+					{"attachment_type": "Image", "path": media_file.name, "file_name": "photo.jpg"}
+				)
+
+		self.assertEqual(media_id, "_media")
+		self.assertEqual(
+			[(params["access_token"], auth) for params, auth, _body in sent],
+			[("stale", "Bearer stale"), ("fresh", "Bearer fresh")],
+		)
+
+		# The whole file is streamed again, and the token never sits in the form
+		self.assertEqual(sent[0][2], sent[1][2])
+		self.assertIn(b"image bytes", sent[1][2])
+		self.assertNotIn(b"access_token", sent[1][2])
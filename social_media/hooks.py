@@ -137,18 +137,46 @@ app_license = "mit"
 # ---------------
 # Hook on document methods and events
 
-# doc_events = {
-# 	"*": {
-# 		"on_update": "method",
-# 		"on_cancel": "method",
-# 		"on_trash": "method"
-# 	}
-# }
+doc_events = {
+	"Facebook Message": {
+		"after_insert": "social_media.utils.conversation_counters.update_counters_on_insert",
+		"on_update": "social_media.utils.message_index.sync_message_index",
+		"on_trash": "social_media.utils.message_index.remove_from_message_index"
+	},
+	"Instagram Message": {
+		"after_insert": "social_media.utils.conversation_counters.update_counters_on_insert",
+		"on_update": "social_media.utils.message_index.sync_message_index",
+		"on_trash": "social_media.utils.message_index.remove_from_message_index"
+	},
+	"WhatsApp Message": {
+		"on_update": "social_media.utils.message_index.sync_message_index",
+		"on_trash": "social_media.utils.message_index.remove_from_message_index"
+	},
+	"Lead": {
+		"on_update": "social_media.utils.phone.sync_phone_lookup",
+		"on_trash": "social_media.utils.phone.remove_phone_lookup"
+	},
+	"Contact": {
+		"on_update": "social_media.utils.phone.sync_phone_lookup",
+		"on_trash": "social_media.utils.phone.remove_phone_lookup"
+	}
+}
 
 # Scheduled Tasks
 # ---------------
 
 scheduler_events = {
+	"cron": {
+		# Channels are polled on their own adaptive intervals, checked every minute
+		"* * * * *": [
+			"social_media.utils.sync_scheduler.schedule_channel_syncs"
+		],
+		# Broadcast shards and sync runs whose worker died are picked up again
+		"*/5 * * * *": [
+			"social_media.utils.broadcast.resume_broadcasts",
+			"social_media.api_social.resume_sync_runs"
+		]
+	},
 	"hourly": [
 		"social_media.utils.lead_creation.auto_create_leads_from_messages"
 	]
@@ -226,7 +254,8 @@ scheduler_events = {
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+	# Sync runs are started as often as every minute
+	"Social Sync Log": 30  # days to retain logs
+}
 
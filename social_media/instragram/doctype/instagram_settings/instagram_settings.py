@@ -1,34 +1,39 @@
 import frappe
-import requests
 from frappe.model.document import Document
 
+from social_media.connectors.base import transport
+from social_media.utils.credentials import get_cached_password, invalidate_credentials
+
 
 class InstagramSettings(Document):
 	def validate(self):
 		if self.enabled and not all([self.app_id, self.app_secret, self.access_token]):
 			frappe.throw("App ID, App Secret, and Access Token are required when Instagram integration is enabled")
-	
+
 	@frappe.whitelist()
 	def test_connection(self):
 		"""Test Instagram API connection"""
 		try:
 			url = f"https://graph.instagram.com/{self.api_version}/me"
-			response = requests.get(url, params={"access_token": self.get_password("access_token")})
-			
+			response = transport.request("GET", url, params={"access_token": self.get_password("access_token")})
+
 			if response.status_code == 200:
 				data = response.json()
 				frappe.msgprint(f"Connection successful! Connected to: {data.get('username', 'Instagram')}")
 				return {"success": True, "data": data}
 			else:
 				frappe.throw(f"Connection failed: {response.text}")
-				
+
 		except Exception as e:
 			frappe.throw(f"Connection test failed: {str(e)}")
-	
+
+	def on_update(self):
+		invalidate_credentials(self.doctype)
+
 	def get_access_token(self):
 		"""Get decrypted access token"""
-		return self.get_password("access_token")
-	
+		return get_cached_password(self.doctype, self.doctype, "access_token")
+
 	def get_app_secret(self):
 		"""Get decrypted app secret"""
-		return self.get_password("app_secret")
\ No newline at end of file
+		return get_cached_password(self.doctype, self.doctype, "app_secret")
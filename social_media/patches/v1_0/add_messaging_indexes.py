@@ -0,0 +1,13 @@
+from social_media.facebook.doctype.facebook_message import facebook_message
+from social_media.instragram.doctype.instagram_message import instagram_message
+from social_media.social_media.doctype.conversation import conversation
+from social_media.whatsapp.doctype.whatsapp_message import whatsapp_message
+
+
+def execute():
+	"""Add the composite indexes used by inbox listing and ingestion on existing sites
+
+	Single column indexes (timestamp, lead) come from search_index during model sync.
+	"""
+	for module in (facebook_message, instagram_message, whatsapp_message, conversation):
+		module.on_doctype_update()
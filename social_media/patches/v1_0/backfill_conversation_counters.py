@@ -0,0 +1,6 @@
+from social_media.utils.conversation_counters import recompute_conversation_counters
+
+
+def execute():
+	"""Fill message counts, last message time and preview of existing conversations"""
+	recompute_conversation_counters()
@@ -0,0 +1,6 @@
+from social_media.utils.phone import rebuild_phone_lookup
+
+
+def execute():
+	"""Index the phone numbers of existing leads and contacts in E.164 form"""
+	rebuild_phone_lookup()
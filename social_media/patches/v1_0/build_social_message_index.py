@@ -0,0 +1,6 @@
+from social_media.utils.message_index import rebuild_message_index
+
+
+def execute():
+	"""Fill the Social Message index from messages stored before it existed"""
+	rebuild_message_index()
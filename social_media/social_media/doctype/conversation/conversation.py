@@ -1,8 +1,26 @@
 import frappe
 from frappe.model.document import Document
 
+from social_media.utils.conversation_counters import recompute_conversation_counters
+
 
 class Conversation(Document):
 	def validate(self):
 		if not self.subject and self.participants:
-			self.subject = f"Conversation with {self.participants}"
\ No newline at end of file
+			self.subject = f"Conversation with {self.participants}"
+
+	@frappe.whitelist()
+	def mark_as_read(self):
+		"""Clear the unread badge without touching the rest of the document"""
+		frappe.db.set_value("Conversation", self.name, "unread_count", 0, update_modified=False)
+
+	@frappe.whitelist()
+	def recompute_counters(self):
+		"""Rebuild the denormalized message counters of this conversation"""
+		recompute_conversation_counters([self.name])
+		self.reload()
+
+
+def on_doctype_update():
+	# Ingestion resolves threads by (channel, external_id)
+	frappe.db.add_index("Conversation", ["channel", "external_id"], index_name="channel_external_id_index")
@@ -0,0 +1,75 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.tests.utils import TEST_PAGE_ID, make_test_account
+from social_media.utils.conversation_counters import recompute_conversation_counters
+from social_media.utils.ingestion import ingest_messages
+
+
+def make_graph_message(thread, sender, text, created_time):
+	return {
+		"id": frappe.generate_hash(),
+		"message": text,
+		"created_time": created_time,
+		"from": {"id": sender},
+		"to": {"data": [{"id": TEST_PAGE_ID}]},
+		"conversation_id": thread,
+		"participants": sender,
+	}
+
+
+class TestConversation(FrappeTestCase):
+	def setUp(self):
+		self.channel = frappe.get_doc("Social Media Channel", make_test_account().channel)
+		self.thread = f"t_{frappe.generate_hash()}"
+
+	def get_conversation(self):
+		return frappe.get_doc("Conversation", {"channel": self.channel.name, "external_id": self.thread})
+
+	def test_counters_follow_ingestion(self):
+		ingest_messages(
+			[
+				make_graph_message(self.thread, "psid-1", "first", "2025-01-01T10:00:00+0000"),
+				make_graph_message(self.thread, TEST_PAGE_ID, "reply", "2025-01-01T10:05:00+0000"),
+			],
+			self.channel,
+		)
+		ingest_messages(
+			[make_graph_message(self.thread, "psid-1", "older", "2025-01-01T09:00:00+0000")], self.channel
+		)
+
+		conversation = self.get_conversation()
+		self.assertEqual(conversation.message_count, 3)
+		self.assertEqual(conversation.unread_count, 2)
+		self.assertEqual(conversation.last_message_preview, "reply")
+
+		conversation.mark_as_read()
+		conversation.db_set("message_count", 0)
+		recompute_conversation_counters([conversation.name])
+
+		conversation.reload()
+		self.assertEqual(conversation.message_count, 3)
+		self.assertEqual(conversation.unread_count, 0)
+		self.assertEqual(conversation.last_message_preview, "reply")
+
+	def test_replayed_batch_leaves_counters_alone(self):
+		messages = [
+			make_graph_message(self.thread, "psid-1", "first", "2025-01-01T10:00:00+0000"),
+			make_graph_message(self.thread, "psid-1", "second", "2025-01-01T10:01:00+0000"),
+		]
+		self.assertEqual(ingest_messages([dict(m) for m in messages], self.channel)["messages"], 2)
+
+		# A racing worker gets past deduplication and only hits the unique key
+		with patch(
+			"social_media.utils.ingestion.filter_new_messages", side_effect=lambda doctype, rows: rows
+		):
+			self.assertEqual(ingest_messages([dict(m) for m in messages], self.channel)["messages"], 0)
+
+		conversation = self.get_conversation()
+		self.assertEqual((conversation.message_count, conversation.unread_count), (2, 2))
+		self.assertEqual(frappe.db.count("Social Message", {"conversation": conversation.name}), 2)
@@ -1,17 +1,22 @@
 import frappe
 from frappe.model.document import Document
 
+from social_media.utils.credentials import get_cached_password, invalidate_credentials
+
 
 class SocialAccount(Document):
 	def validate(self):
 		if self.expires_on and self.expires_on < frappe.utils.now():
 			self.status = "Expired"
-	
+
+	def on_update(self):
+		invalidate_credentials(self.doctype, self.name)
+
 	def get_access_token(self):
-		return self.get_password("oauth_access_token")
-	
+		return get_cached_password(self.doctype, self.name, "oauth_access_token")
+
 	def get_refresh_token(self):
-		return self.get_password("refresh_token")
-	
+		return get_cached_password(self.doctype, self.name, "refresh_token")
+
 	def get_app_secret(self):
-		return self.get_password("app_secret")
\ No newline at end of file
+		return get_cached_password(self.doctype, self.name, "app_secret")
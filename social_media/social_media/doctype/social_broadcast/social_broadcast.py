@@ -0,0 +1,12 @@
+import frappe
+from frappe.model.document import Document
+
+
+class SocialBroadcast(Document):
+	@frappe.whitelist()
+	def resume(self):
+		"""Restart shard jobs of a broadcast whose workers stopped"""
+		from social_media.utils.broadcast import resume_broadcasts
+
+		resume_broadcasts([self.name])
+		return {"success": True, "message": "Broadcast resumed"}
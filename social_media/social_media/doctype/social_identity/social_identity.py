@@ -0,0 +1,19 @@
+import frappe
+from frappe.model.document import Document
+
+from social_media.utils.identity import clear_identity_cache
+
+
+class SocialIdentity(Document):
+	def on_update(self):
+		clear_identity_cache([(self.platform, self.page_id, self.sender_id)])
+
+	def on_trash(self):
+		clear_identity_cache([(self.platform, self.page_id, self.sender_id)])
+
+
+def on_doctype_update():
+	# One identity per sender of a page, sender first for IN lookups
+	frappe.db.add_unique(
+		"Social Identity", ["sender_id", "page_id", "platform"], constraint_name="unique_sender_page_platform"
+	)
@@ -0,0 +1,13 @@
+import frappe
+from frappe.model.document import Document
+
+
+class SocialMessage(Document):
+	pass
+
+
+def on_doctype_update():
+	# Thread view, newest first
+	frappe.db.add_index(
+		"Social Message", ["conversation", "timestamp"], index_name="conversation_timestamp_index"
+	)
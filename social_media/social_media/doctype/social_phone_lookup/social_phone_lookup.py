@@ -0,0 +1,16 @@
+import frappe
+from frappe.model.document import Document
+
+
+class SocialPhoneLookup(Document):
+	pass
+
+
+def on_doctype_update():
+	# Phone matching probes by number, maintenance deletes by reference
+	frappe.db.add_index(
+		"Social Phone Lookup", ["phone", "reference_doctype"], index_name="phone_reference_doctype_index"
+	)
+	frappe.db.add_index(
+		"Social Phone Lookup", ["reference_doctype", "reference_name"], index_name="reference_index"
+	)
@@ -0,0 +1,75 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.api import get_all_messages, get_inbox
+from social_media.utils.ingestion import bulk_insert_rows
+from social_media.utils.message_index import index_message_rows
+
+
+class TestInbox(FrappeTestCase):
+	def setUp(self):
+		# Future timestamps so the seeded rows are the newest in the inbox
+		base = frappe.utils.add_days(frappe.utils.now_datetime(), 365)
+
+		# A busy Facebook page and a quiet WhatsApp number, interleaved in time
+		self.expected = []
+		for doctype, count, step, extra in (
+			("Facebook Message", 25, 1, {"page_id": "_test_inbox", "sender_id": "_s", "recipient_id": "_r"}),
+			("WhatsApp Message", 5, 7, {"phone_number": "+10000000000"}),
+		):
+			rows = [
+				dict(
+					extra,
+					message_id=frappe.generate_hash(),
+					message_type="text",
+					timestamp=frappe.utils.add_to_date(base, seconds=-i * step),
+				)
+				for i in range(count)
+			]
+			bulk_insert_rows(doctype, rows)
+			index_message_rows(doctype, rows)
+			self.expected.extend((row["timestamp"], row["name"]) for row in rows)
+
+		self.expected.sort(reverse=True)
+
+	def test_pages_follow_global_order(self):
+		seen, cursor = [], None
+		for _ in range(3):
+			page = get_inbox(limit=10, cursor=cursor)
+			seen.extend((m.timestamp, m.name) for m in page["messages"])
+			cursor = page["next_cursor"]
+
+		self.assertEqual(seen, self.expected)
+
+
+class TestInboxContent(FrappeTestCase):
+	def test_messages_keep_full_content_and_platform_fields(self):
+		timestamp = frappe.utils.add_days(frappe.utils.now_datetime(), 730)
+		content = "x" * 500
+
+		for doctype, row in (
+			("Facebook Message", {"page_id": "_test_inbox", "sender_id": "_s", "recipient_id": "_r"}),
+			("WhatsApp Message", {"phone_number": "+10000000001"}),
+		):
+			rows = [
+				dict(
+					row,
+					message_id=frappe.generate_hash(),
+					message_type="text",
+					message_content=content,
+					timestamp=timestamp,
+				)
+			]
+			bulk_insert_rows(doctype, rows)
+			index_message_rows(doctype, rows)
+
+		messages = {m.platform: m for m in get_all_messages(limit=2)}
+
+		self.assertEqual(messages["Facebook"].message_content, content)
+		self.assertEqual(len(messages["Facebook"].preview), 140)
+		self.assertEqual((messages["Facebook"].sender_id, messages["Facebook"].recipient_id), ("_s", "_r"))
+		self.assertEqual(messages["WhatsApp"].recipient_id, "+10000000001")
+		self.assertEqual(messages["WhatsApp"].message_content, content)
@@ -0,0 +1,46 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.api_lead import compute_lead_stats, get_lead_stats
+from social_media.connectors.meta.facebook import FacebookConnector
+from social_media.tests.utils import make_messaging_payload, make_test_account
+from social_media.utils.message_index import index_message_rows
+
+
+class TestLeadStats(FrappeTestCase):
+	def test_stats_are_cached_until_messages_change(self):
+		before = get_lead_stats()
+
+		with self.assertQueryCount(0):
+			self.assertEqual(get_lead_stats(), before)
+
+		FacebookConnector(make_test_account()).process_webhook(
+			make_messaging_payload(1, 2, prefix=frappe.generate_hash())
+		)
+
+		after = get_lead_stats()
+		self.assertEqual(after["facebook"]["total_messages"], before["facebook"]["total_messages"] + 2)
+		self.assertEqual(after["facebook"]["pending"], before["facebook"]["pending"] + 2)
+
+	def test_empty_lead_counts_as_pending(self):
+		before = compute_lead_stats()["whatsapp"]
+
+		index_message_rows(
+			"WhatsApp Message",
+			[
+				{
+					"name": frappe.generate_hash(),
+					"phone_number": "+10000000002",
+					"timestamp": frappe.utils.now(),
+					"lead": lead,
+				}
+				for lead in ("", None)
+			],
+		)
+
+		after = compute_lead_stats()["whatsapp"]
+		self.assertEqual(after["leads_created"], before["leads_created"])
+		self.assertEqual(after["pending"], before["pending"] + 2)
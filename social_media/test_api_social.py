@@ -0,0 +1,208 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+import time
+from unittest.mock import Mock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.api_social import (
+	SYNC_QUEUE_KEY,
+	SYNC_RUNNING_KEY,
+	process_webhook_event,
+	publish_social_post,
+	resume_sync_runs,
+	sync_channel,
+	sync_channel_job,
+	webhook_receiver,
+)
+from social_media.connectors.meta.facebook import FacebookConnector
+from social_media.social_media.doctype.social_post.social_post import SocialPost
+from social_media.tests.utils import make_messaging_payload, make_response, make_test_account
+from social_media.utils.locks import acquire_lock, release_lock
+from social_media.utils.sync_scheduler import record_webhook_activity
+
+
+class TestChannelSync(FrappeTestCase):
+	def setUp(self):
+		self.channel = make_test_account().channel
+		self.sync_log = frappe.get_doc(
+			{"doctype": "Social Sync Log", "started_at": frappe.utils.now(), "total_channels": 2}
+		).insert(ignore_permissions=True)
+
+	@patch("social_media.api_social.start_next_channel_sync")
+	@patch("social_media.api_social.sync_channel", return_value={"messages": 3, "requests": 2})
+	def test_overlapping_runs_skip_a_locked_channel(self, sync_channel, start_next):
+		lock = f"social_media:sync_lock:{self.channel}"
+		token = acquire_lock(lock, 60)
+		try:
+			sync_channel_job(self.channel, self.sync_log.name, 1)
+		finally:
+			release_lock(lock, token)
+
+		sync_channel_job(self.channel, self.sync_log.name, 2)
+
+		self.assertEqual(sync_channel.call_count, 1)
+		self.assertEqual(start_next.call_count, 2)
+
+		self.sync_log.reload()
+		self.assertEqual([row.status for row in self.sync_log.channels], ["Skipped", "Success"])
+		self.assertEqual((self.sync_log.skipped_channels, self.sync_log.total_messages), (1, 3))
+		self.assertEqual(self.sync_log.status, "Completed")
+
+	@patch.object(FacebookConnector, "make_request", return_value=make_response(500, {"error": "boom"}))
+	def test_failed_listing_keeps_cursor_and_last_sync(self, make_request):
+		frappe.cache().delete_value(f"social_media:sync_cursor:{self.channel}")
+		last_sync = frappe.db.get_value("Social Media Channel", self.channel, "last_sync")
+
+		sync_channel(self.channel)
+
+		self.assertEqual(frappe.db.get_value("Social Media Channel", self.channel, "last_sync"), last_sync)
+		self.assertTrue(frappe.cache().get_value(f"social_media:sync_cursor:{self.channel}"))
+
+	def test_finished_sync_keeps_webhook_activity_recorded_meanwhile(self):
+		frappe.cache().delete_value(f"social_media:sync_cursor:{self.channel}")
+		frappe.db.set_value("Social Media Channel", self.channel, "last_webhook_at", None)
+
+		def iter_messages(connector, cursor=None, **kwargs):
+			record_webhook_activity([self.channel])
+			cursor["done"] = True
+			yield from []
+
+		with patch.object(FacebookConnector, "iter_messages", iter_messages):
+			sync_channel(self.channel)
+
+		last_sync, last_webhook_at = frappe.db.get_value(
+			"Social Media Channel", self.channel, ["last_sync", "last_webhook_at"]
+		)
+		self.assertTrue(last_sync)
+		self.assertTrue(last_webhook_at)
+
+
+class TestSyncRunRecovery(FrappeTestCase):
+	def setUp(self):
+		self.sync_log = frappe.get_doc(
+			{
+				"doctype": "Social Sync Log",
+				"status": "Running",
+				"started_at": frappe.utils.now(),
+				"total_channels": 3,
+			}
+		).insert(ignore_permissions=True)
+
+		cache = frappe.cache()
+		self.queue_key = cache.make_key(SYNC_QUEUE_KEY.format(self.sync_log.name))
+		self.running_key = cache.make_key(SYNC_RUNNING_KEY.format(self.sync_log.name))
+
+		# First channel lost with its worker an hour ago, the other two never started
+		pipe = cache.pipeline()
+		pipe.delete(self.queue_key, self.running_key)
+		pipe.hset(self.running_key, "1:_lost", time.time() - 3600)
+		pipe.rpush(self.queue_key, "2:_next", "3:_last")
+		pipe.execute()
+
+	def tearDown(self):
+		frappe.cache().delete(self.queue_key, self.running_key)
+
+	@patch("social_media.api_social.frappe.enqueue")
+	def test_lost_channel_fails_and_next_channel_starts(self, enqueue):
+		resume_sync_runs()
+
+		self.sync_log.reload()
+		self.assertEqual([(row.channel, row.status) for row in self.sync_log.channels], [("_lost", "Failed")])
+		self.assertEqual((self.sync_log.processed_channels, self.sync_log.failed_channels), (1, 1))
+		self.assertEqual(self.sync_log.status, "Running")
+		self.assertEqual(enqueue.call_args.kwargs["channel"], "_next")
+		self.assertEqual(frappe.cache().pipeline().hkeys(self.running_key).execute()[0], [b"2:_next"])
+
+	@patch("social_media.api_social.is_job_enqueued", return_value=True)
+	@patch("social_media.api_social.frappe.enqueue")
+	def test_running_jobs_are_left_alone(self, enqueue, is_job_enqueued):
+		resume_sync_runs()
+
+		enqueue.assert_not_called()
+		self.assertEqual(frappe.db.get_value("Social Sync Log", self.sync_log.name, "processed_channels"), 0)
+
+	def test_run_without_queued_or_running_channels_is_closed(self):
+		frappe.cache().delete(self.queue_key, self.running_key)
+
+		resume_sync_runs()
+
+		self.sync_log.reload()
+		self.assertEqual(self.sync_log.status, "Completed with Errors")
+		self.assertEqual((self.sync_log.processed_channels, self.sync_log.failed_channels), (3, 3))
+		self.assertTrue(self.sync_log.finished_at)
+
+
+class TestPublishPost(FrappeTestCase):
+	def setUp(self):
+		self.channels = [
+			make_test_account().channel,
+			make_test_account("_Test Facebook Page 2", "_test_fb_page_2").channel,
+		]
+		self.post = frappe.get_doc(
+			{
+				"doctype": "Social Post",
+				"title": "_Test Post",
+				"content": "Hello",
+				"platforms": [{"channel": channel} for channel in self.channels],
+			}
+		).insert(ignore_permissions=True)
+
+	@patch.dict(frappe.conf, {"social_media_publish_concurrency": 1})
+	def test_failing_channel_does_not_stop_the_others(self):
+		def get_connector(platform, account_doc):
+			connector = Mock(channel=frappe._dict(name=account_doc.channel))
+			if account_doc.channel == self.channels[0]:
+				connector.publish_post.side_effect = RuntimeError("boom")
+			else:
+				connector.publish_post.return_value = {"success": True, "post_id": "_post"}
+			return connector
+
+		save = SocialPost.save
+		with (
+			patch("social_media.api_social.get_connector", side_effect=get_connector),
+			patch.object(SocialPost, "save", autospec=True, side_effect=save) as saved,
+		):
+			result = publish_social_post(self.post.name)
+
+		self.assertEqual([r["success"] for r in result["results"]], [False, True])
+
+		# Once when publishing starts, once with every channel's outcome
+		self.assertEqual(saved.call_count, 2)
+
+		self.post.reload()
+		self.assertEqual(self.post.status, "Partially Published")
+		self.assertEqual([row.status for row in self.post.platforms], ["Failed", "Published"])
+		self.assertEqual(self.post.platforms[1].platform_post_id, "_post")
+
+
+class TestWebhookReceiver(FrappeTestCase):
+	def setUp(self):
+		make_test_account()
+		self.prefix = frappe.generate_hash()
+		frappe.local.form_dict = frappe._dict(make_messaging_payload(1, 2, prefix=self.prefix))
+
+	def tearDown(self):
+		frappe.local.form_dict = frappe._dict()
+
+	@patch("social_media.api_social.frappe.enqueue")
+	def test_receiver_only_verifies_and_enqueues(self, enqueue):
+		with patch("social_media.api_social.process_webhook_event") as process, self.assertQueryCount(0):
+			self.assertEqual(webhook_receiver("Facebook"), {"success": True})
+
+		process.assert_not_called()
+		enqueue.assert_called_once()
+		self.assertEqual(enqueue.call_args.args, ("social_media.api_social.process_webhook_event",))
+
+	@patch("social_media.api_social.frappe.enqueue")
+	def test_queued_job_stores_a_redelivered_payload_once(self, enqueue):
+		webhook_receiver("Facebook")
+		job = {key: value for key, value in enqueue.call_args.kwargs.items() if key != "queue"}
+
+		# Platforms redeliver events they got no timely answer for
+		process_webhook_event(**job)
+		process_webhook_event(**job)
+
+		self.assertEqual(frappe.db.count("Facebook Message", {"message_id": ["like", f"{self.prefix}.%"]}), 2)
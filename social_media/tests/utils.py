@@ -0,0 +1,67 @@
+"""Fixtures shared by the app's test modules"""
+
+import json
+import time
+from unittest.mock import Mock
+
+import frappe
+
+TEST_PAGE_ID = "_test_fb_page"
+
+
+def make_test_account(channel_name="_Test Facebook Page", account_id=TEST_PAGE_ID):
+	if not frappe.db.exists("Social Media Channel", channel_name):
+		frappe.get_doc(
+			{
+				"doctype": "Social Media Channel",
+				"channel_name": channel_name,
+				"platform": "Facebook",
+				"account_id": account_id,
+			}
+		).insert()
+
+	account = frappe.db.get_value("Social Account", {"channel": channel_name})
+	if account:
+		return frappe.get_doc("Social Account", account)
+
+	return frappe.get_doc(
+		{
+			"doctype": "Social Account",
+			"naming_series": "SM-ACC-.YYYY.-",
+			"channel": channel_name,
+			"oauth_access_token": "test-token",
+		}
+	).insert()
+
+
+def make_messaging_payload(entries, events_per_entry, page_id=TEST_PAGE_ID, prefix="mid"):
+	now_ms = int(time.time() * 1000)
+	return {
+		"object": "page",
+		"entry": [
+			{
+				"id": page_id,
+				"time": now_ms,
+				"messaging": [
+					{
+						"sender": {"id": f"psid-{e}-{i}"},
+						"recipient": {"id": page_id},
+						"timestamp": now_ms,
+						"message": {"mid": f"{prefix}.{e}.{i}", "text": f"hello {i}"},
+					}
+					for i in range(events_per_entry)
+				],
+			}
+			for e in range(entries)
+		],
+	}
+
+
+def make_response(status_code=200, data=None, headers=None):
+	"""Stand-in for a requests.Response of a Graph call"""
+	return Mock(
+		status_code=status_code,
+		headers=headers or {},
+		text=json.dumps(data or {}),
+		json=Mock(return_value=data or {}),
+	)
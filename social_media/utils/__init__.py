@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import frappe
+
+
+def chunked(iterable, size):
+	"""Yield lists of up to size items from any iterable, without materializing it"""
+	iterator = iter(iterable)
+
+	while chunk := list(islice(iterator, size)):
+		yield chunk
+
+
+def run_concurrently(fn, items, max_workers):
+	"""Run fn for every item in a thread pool and return the results in item order
+
+	Each thread gets its own site context and database connection, which is
+	committed when fn returns. With a single worker or item, fn runs inline.
+	"""
+	items = list(items)
+
+	if max_workers <= 1 or len(items) <= 1:
+		return [fn(item) for item in items]
+
+	site = frappe.local.site
+	sites_path = frappe.local.sites_path
+	user = frappe.session.user
+
+	def run(item):
+		frappe.init(site=site, sites_path=sites_path)
+		frappe.connect()
+		frappe.set_user(user)
+
+		try:
+			result = fn(item)
+			frappe.db.commit()
+			return result
+		finally:
+			frappe.destroy()
+
+	with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+		return list(executor.map(run, items))
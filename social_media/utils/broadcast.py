@@ -0,0 +1,234 @@
+import frappe
+from frappe import _
+from frappe.utils.background_jobs import is_job_enqueued
+
+from social_media.config import get_setting
+from social_media.connectors.base.connector import RateLimiter, RateLimitExceeded
+from social_media.utils import chunked
+from social_media.utils.ingestion import bulk_insert_rows
+from social_media.utils.phone import get_default_region, normalize_phone
+
+
+def create_broadcast(platform, recipients, message_content, message_type="text", **kwargs):
+	"""Queue one message per recipient and start the shard jobs sending them, returns the Social Broadcast
+
+	Send Message rows are bulk inserted in chunks, already spread over
+	broadcast_concurrency shards; each shard is sent by its own job.
+	"""
+	platform = platform.title()
+
+	if platform == "WhatsApp":
+		region = get_default_region()
+		recipients = [normalize_phone(recipient, region) for recipient in recipients]
+
+	recipients = list(dict.fromkeys(recipient for recipient in recipients if recipient))
+	if not recipients:
+		frappe.throw(_("No recipients to send to"))
+
+	shards = max(1, min(get_setting("broadcast_concurrency"), len(recipients)))
+
+	broadcast = frappe.get_doc(
+		{
+			"doctype": "Social Broadcast",
+			"platform": platform,
+			"message_type": message_type,
+			"message_content": message_content,
+			"media_url": kwargs.get("media_url"),
+			"template_name": kwargs.get("template_name"),
+			"status": "Sending",
+			"total_recipients": len(recipients),
+			"shard_count": shards,
+			"started_at": frappe.utils.now(),
+		}
+	).insert()
+
+	rows = (
+		{
+			"platform": platform,
+			"recipient": recipient,
+			"message_type": message_type,
+			"message_content": message_content,
+			"media_url": kwargs.get("media_url"),
+			"template_name": kwargs.get("template_name"),
+			"send_immediately": 0,
+			"status": "Queued",
+			"retry_count": 0,
+			"broadcast": broadcast.name,
+			"shard": i % shards,
+		}
+		for i, recipient in enumerate(recipients)
+	)
+
+	for chunk in chunked(rows, get_setting("broadcast_chunk_size")):
+		bulk_insert_rows("Send Message", chunk)
+
+	for shard in range(shards):
+		enqueue_shard(broadcast.name, shard, enqueue_after_commit=True)
+
+	return broadcast
+
+
+def enqueue_shard(broadcast, shard, enqueue_after_commit=False):
+	frappe.enqueue(
+		"social_media.utils.broadcast.send_broadcast_shard",
+		queue="long",
+		timeout=3600 * 4,
+		job_id=get_shard_job_id(broadcast, shard),
+		deduplicate=True,
+		enqueue_after_commit=enqueue_after_commit,
+		broadcast=broadcast,
+		shard=shard,
+	)
+
+
+def send_broadcast_shard(broadcast, shard):
+	"""Background job sending the queued messages of one shard of a broadcast
+
+	Only messages still Queued are picked up, so a job restarted after a crash
+	resumes where the last commit left off. Statuses and progress counters are
+	committed together every broadcast_commit_interval messages, which bounds
+	what a crash can send twice.
+	"""
+	platform = frappe.db.get_value("Social Broadcast", broadcast, "platform")
+	rate_limiter = get_rate_limiter(platform)
+
+	while True:
+		names = frappe.get_all(
+			"Send Message",
+			filters={"broadcast": broadcast, "shard": shard, "status": "Queued"},
+			order_by="name asc",
+			limit=get_setting("broadcast_chunk_size"),
+			pluck="name",
+		)
+		if not names:
+			break
+
+		for batch in chunked(names, get_setting("broadcast_commit_interval")):
+			counts = {"Sent": 0, "Failed": 0}
+			throttled = False
+			for name in batch:
+				try:
+					rate_limiter.wait_if_needed()
+				except RateLimitExceeded:
+					throttled = True
+					break
+
+				counts[send_queued_message(name)] += 1
+
+			update_progress(broadcast, counts["Sent"], counts["Failed"])
+			frappe.db.commit()
+
+			if throttled:
+				# resume_broadcasts starts the shard again once the bucket has refilled
+				return
+
+	finish_broadcast(broadcast)
+	frappe.db.commit()
+
+
+def send_queued_message(name) -> str:
+	"""Send one queued message and store the outcome with a single write, returns its status"""
+	message = frappe.get_doc("Send Message", name)
+
+	try:
+		result = message.deliver()
+	except Exception as e:
+		result = {"success": False, "error": str(e)}
+
+	if result and result.get("success"):
+		values = {
+			"status": "Sent",
+			"sent_at": frappe.utils.now(),
+			"response_message": result.get("message", ""),
+			"created_message_id": result.get("message_id", ""),
+		}
+	else:
+		values = {
+			"status": "Failed",
+			"error_log": result.get("error", "Unknown error") if result else "No response",
+			"retry_count": (message.retry_count or 0) + 1,
+		}
+
+	frappe.db.set_value("Send Message", name, values)
+	return values["status"]
+
+
+def update_progress(broadcast, sent, failed):
+	"""Add a batch's outcome to the broadcast counters with one atomic UPDATE"""
+	frappe.db.sql(
+		"""update `tabSocial Broadcast` set
+			sent_count = sent_count + %(sent)s,
+			failed_count = failed_count + %(failed)s
+		where name = %(name)s""",
+		{"name": broadcast, "sent": sent, "failed": failed},
+	)
+
+
+def finish_broadcast(broadcast):
+	"""Close the broadcast once no shard has queued messages left"""
+	if frappe.db.exists("Send Message", {"broadcast": broadcast, "status": "Queued"}):
+		return
+
+	frappe.db.sql(
+		"""update `tabSocial Broadcast` set
+			status = if(failed_count > 0, 'Completed with Errors', 'Completed'),
+			finished_at = %(now)s
+		where name = %(name)s and status = 'Sending'""",
+		{"name": broadcast, "now": frappe.utils.now()},
+	)
+
+
+def resume_broadcasts(broadcasts=None):
+	"""Scheduler job restarting shard jobs of unfinished broadcasts lost with a worker"""
+	filters = {"status": "Sending"}
+	if broadcasts:
+		filters["name"] = ["in", broadcasts]
+
+	for broadcast in frappe.get_all("Social Broadcast", filters=filters, fields=["name"]):
+		shards = frappe.get_all(
+			"Send Message",
+			filters={"broadcast": broadcast.name, "status": "Queued"},
+			distinct=True,
+			pluck="shard",
+		)
+
+		if not shards:
+			finish_broadcast(broadcast.name)
+			continue
+
+		for shard in shards:
+			# Deduplication leaves shards with a queued or running job alone
+			if not is_job_enqueued(get_shard_job_id(broadcast.name, shard)):
+				enqueue_shard(broadcast.name, shard)
+
+
+def get_rate_limiter(platform):
+	"""Rate limiter shared with the connectors, for the sending phone number or page"""
+	if platform == "WhatsApp":
+		return RateLimiter(
+			platform, phone_number_id=frappe.db.get_single_value("WhatsApp Settings", "phone_number_id")
+		)
+
+	page_id = frappe.db.get_value(
+		"Social Media Channel", {"platform": platform, "status": "Active", "is_default": 1}, "account_id"
+	)
+	return RateLimiter(platform, page_id=page_id)
+
+
+def get_shard_job_id(broadcast, shard) -> str:
+	return f"social_media_broadcast:{broadcast}:{shard}"
+
+
+def get_progress(broadcast) -> dict:
+	"""Queued / sent / failed counters of a broadcast, read from its row"""
+	progress = frappe.db.get_value(
+		"Social Broadcast",
+		broadcast,
+		["status", "total_recipients", "sent_count", "failed_count"],
+		as_dict=True,
+	)
+	if not progress:
+		frappe.throw(_("Broadcast {0} not found").format(broadcast), frappe.DoesNotExistError)
+
+	progress["queued_count"] = progress.total_recipients - progress.sent_count - progress.failed_count
+	return progress
@@ -0,0 +1,84 @@
+import frappe
+from frappe.utils import get_datetime
+
+from social_media.utils.message_index import PREVIEW_LENGTH
+
+
+def update_conversation_counters(messages):
+	"""Fold newly stored messages into their conversations' counters
+
+	One atomic UPDATE per conversation, relative to the stored values, so
+	concurrent writers never lose increments and the document is never loaded.
+	"""
+	updates = {}
+	for message in messages:
+		conversation = message.get("conversation_id")
+		if not conversation:
+			continue
+
+		update = updates.setdefault(conversation, {"count": 0, "unread": 0, "time": None, "preview": None})
+		update["count"] += 1
+		if is_incoming(message):
+			update["unread"] += 1
+
+		timestamp = get_datetime(message.get("timestamp") or frappe.utils.now_datetime())
+		if not update["time"] or timestamp >= update["time"]:
+			update["time"] = timestamp
+			update["preview"] = (message.get("message_content") or "")[:PREVIEW_LENGTH]
+
+	for conversation, update in updates.items():
+		# MariaDB applies SET clauses left to right, so the preview is compared with the old time
+		frappe.db.sql(
+			"""update `tabConversation` set
+				message_count = ifnull(message_count, 0) + %(count)s,
+				unread_count = ifnull(unread_count, 0) + %(unread)s,
+				last_message_preview = if(last_message_time is null or last_message_time <= %(time)s,
+					%(preview)s, last_message_preview),
+				last_message_time = greatest(ifnull(last_message_time, %(time)s), %(time)s)
+			where name = %(name)s""",
+			dict(update, name=conversation),
+		)
+
+
+def update_counters_on_insert(doc, method=None):
+	"""doc_events hook for messages inserted one at a time"""
+	update_conversation_counters([doc])
+
+
+def is_incoming(message) -> bool:
+	"""Messages sent by the page/account itself do not count as unread"""
+	return message.get("sender_id") not in (message.get("page_id"), message.get("instagram_user_id"))
+
+
+def recompute_conversation_counters(conversations=None):
+	"""Rebuild message count, last message time and preview from the Social Message index
+
+	Unread counts cannot be derived from the messages and are only capped
+	at the recomputed message count.
+	"""
+	condition, inner_condition = "", ""
+	if conversations:
+		condition = "where c.name in %(conversations)s"
+		inner_condition = "and conversation in %(conversations)s"
+
+	frappe.db.sql(
+		f"""update `tabConversation` c
+			left join (
+				select conversation, count(*) as message_count, max(`timestamp`) as last_message_time
+				from `tabSocial Message`
+				where conversation is not null {inner_condition}
+				group by conversation
+			) m on m.conversation = c.name
+			set
+				c.message_count = ifnull(m.message_count, 0),
+				c.unread_count = least(ifnull(c.unread_count, 0), ifnull(m.message_count, 0)),
+				c.last_message_time = ifnull(m.last_message_time, c.last_message_time),
+				c.last_message_preview = (
+					select preview from `tabSocial Message` s
+					where s.conversation = c.name
+					order by s.`timestamp` desc, s.name desc
+					limit 1
+				)
+			{condition}""",
+		{"conversations": tuple(conversations or ())},
+	)
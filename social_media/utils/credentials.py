@@ -0,0 +1,37 @@
+import threading
+import time
+
+import frappe
+from frappe.utils.password import get_decrypted_password
+
+from social_media.config import get_setting
+
+# Decrypted secrets per (site, doctype, name, fieldname), with their expiry time
+_credentials = {}
+_lock = threading.Lock()
+
+
+def get_cached_password(doctype, name, fieldname):
+	"""Get a decrypted password field, cached in this process for a short time"""
+	key = (frappe.local.site, doctype, name, fieldname)
+
+	cached = _credentials.get(key)
+	if cached and cached[1] > time.monotonic():
+		return cached[0]
+
+	value = get_decrypted_password(doctype, name, fieldname, raise_exception=False)
+
+	with _lock:
+		_credentials[key] = (value, time.monotonic() + get_setting("credential_cache_ttl"))
+
+	return value
+
+
+def invalidate_credentials(doctype, name=None):
+	"""Drop cached secrets of a document (or of all documents of a doctype)"""
+	site = frappe.local.site
+
+	with _lock:
+		for key in list(_credentials):
+			if key[0] == site and key[1] == doctype and (name is None or key[2] == name):
+				_credentials.pop(key, None)
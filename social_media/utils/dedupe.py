@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+
+import frappe
+
+from social_media.config import get_setting
+
+# Column that scopes a platform message id, matching the unique index of each DocType
+MESSAGE_SCOPE_FIELDS = {
+	"Facebook Message": "page_id",
+	"Instagram Message": "instagram_user_id",
+	"WhatsApp Message": "phone_number_id",
+}
+
+# Recently stored message ids per (site, doctype, scope, message_id), oldest first
+_recent = OrderedDict()
+_lock = threading.Lock()
+
+
+def filter_new_messages(doctype, rows) -> list:
+	"""Drop message rows that were already stored
+
+	Replayed ids are dropped from the in-process LRU without a query, the
+	rest are checked with a single IN lookup. The unique index remains the
+	final guard against concurrent inserts from other workers.
+	"""
+	scope = MESSAGE_SCOPE_FIELDS[doctype]
+	site = frappe.local.site
+
+	fresh, keys = [], {}
+	for row in rows:
+		if not row.get("message_id"):
+			fresh.append(row)
+			continue
+
+		key = (site, doctype, row.get(scope), row["message_id"])
+		if key in keys or is_recent(key):
+			continue
+
+		keys[key] = row
+		fresh.append(row)
+
+	if not keys:
+		return fresh
+
+	stored = {
+		(site, doctype, scope_value, message_id)
+		for scope_value, message_id in frappe.get_all(
+			doctype,
+			filters={"message_id": ["in", [key[3] for key in keys]]},
+			fields=[scope, "message_id"],
+			as_list=True,
+		)
+	}
+
+	remember(stored)
+	# New ids only count as seen once their insert is committed
+	frappe.db.after_commit.add(partial(remember, set(keys) - stored))
+
+	duplicates = {id(keys[key]) for key in stored if key in keys}
+	return [row for row in fresh if id(row) not in duplicates]
+
+
+def is_recent(key) -> bool:
+	with _lock:
+		if key not in _recent:
+			return False
+
+		_recent.move_to_end(key)
+		return True
+
+
+def remember(keys):
+	"""Add ids to the LRU, evicting the least recently seen beyond the configured size"""
+	size = get_setting("dedupe_cache_size")
+
+	with _lock:
+		for key in keys:
+			_recent[key] = True
+			_recent.move_to_end(key)
+
+		while len(_recent) > size:
+			_recent.popitem(last=False)
@@ -0,0 +1,79 @@
+import frappe
+
+# Redis hash of "platform:page_id:sender_id" -> lead, cached misses included
+IDENTITY_CACHE_KEY = "social_media:identity"
+# hget re-runs the generator on a stored None, so a miss is cached as this instead
+NO_LEAD = ""
+
+
+def get_identity_lead(platform, page_id, sender_id):
+	"""Lead of a platform sender, from the cache or one indexed read"""
+	if not (page_id and sender_id):
+		return None
+
+	lead = frappe.cache().hget(
+		IDENTITY_CACHE_KEY,
+		identity_key(platform, page_id, sender_id),
+		generator=lambda: (
+			frappe.db.get_value(
+				"Social Identity", {"sender_id": sender_id, "page_id": page_id, "platform": platform}, "lead"
+			)
+			or NO_LEAD
+		),
+	)
+
+	return lead or None
+
+
+def get_identity_leads(identities) -> dict:
+	"""Resolve many (platform, page_id, sender_id) keys to leads with one query"""
+	identities = set(identities)
+	if not identities:
+		return {}
+
+	rows = frappe.get_all(
+		"Social Identity",
+		filters={
+			"sender_id": ["in", list({sender_id for _platform, _page_id, sender_id in identities})],
+			"lead": ["is", "set"],
+		},
+		fields=["platform", "page_id", "sender_id", "lead"],
+	)
+
+	return {
+		(row.platform, row.page_id, row.sender_id): row.lead
+		for row in rows
+		if (row.platform, row.page_id, row.sender_id) in identities
+	}
+
+
+def save_identities(leads):
+	"""Record {(platform, page_id, sender_id): lead} mappings in one insert"""
+	leads = {key: lead for key, lead in leads.items() if key[1] and key[2]}
+	if not leads:
+		return
+
+	now = frappe.utils.now()
+	user = frappe.session.user
+
+	frappe.db.bulk_insert(
+		"Social Identity",
+		["name", "creation", "modified", "owner", "modified_by", "platform", "page_id", "sender_id", "lead"],
+		[
+			[frappe.generate_hash(length=10), now, now, user, user, platform, page_id, sender_id, lead]
+			for (platform, page_id, sender_id), lead in leads.items()
+		],
+		ignore_duplicates=True,
+	)
+
+	clear_identity_cache(leads)
+
+
+def clear_identity_cache(identities):
+	cache = frappe.cache()
+	for identity in identities:
+		cache.hdel(IDENTITY_CACHE_KEY, identity_key(*identity))
+
+
+def identity_key(platform, page_id, sender_id) -> str:
+	return f"{platform}:{page_id}:{sender_id}"
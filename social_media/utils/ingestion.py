@@ -0,0 +1,234 @@
+from datetime import datetime, timezone
+
+import frappe
+from frappe.model.naming import parse_naming_series
+from frappe.utils import convert_utc_to_system_timezone, get_datetime
+
+from social_media.utils.conversation_counters import update_conversation_counters
+from social_media.utils.dedupe import filter_new_messages
+from social_media.utils.lead_creation import queue_lead_creation
+from social_media.utils.message_index import index_message_rows
+from social_media.utils.phone import normalize_phone
+
+MESSAGE_DOCTYPES = {
+	"Facebook": "Facebook Message",
+	"Instagram": "Instagram Message",
+	"WhatsApp": "WhatsApp Message",
+}
+
+
+def build_message_row(message, channel_doc) -> dict:
+	"""Map a Graph style message to the columns of the channel's message DocType"""
+	doctype = MESSAGE_DOCTYPES[channel_doc.platform]
+	timestamp = to_system_datetime(message.get("created_time"))
+	sender = message.get("from") or {}
+	recipients = (message.get("to") or {}).get("data") or [{}]
+
+	message_type = message.get("message_type")
+	if message_type not in frappe.get_meta(doctype).get_field("message_type").options.split("\n"):
+		message_type = "text"
+
+	row = {"message_type": message_type, "message_content": message.get("message"), "timestamp": timestamp}
+
+	if doctype == "WhatsApp Message":
+		row.update(
+			{
+				"message_id": message.get("id"),
+				# WhatsApp sends the number with its country code but without "+"
+				"phone_number": normalize_phone(f"+{(sender.get('id') or '').lstrip('+')}"),
+				"phone_number_id": channel_doc.account_id,
+				"contact_name": sender.get("name"),
+			}
+		)
+		return row
+
+	row.update(
+		{
+			"message_id": message.get("id"),
+			"sender_id": sender.get("id"),
+			"recipient_id": recipients[0].get("id") or channel_doc.account_id,
+			"status": "delivered",
+			"conversation_id": message.get("conversation_id"),
+			"created_time": timestamp,
+			"modified_time": timestamp,
+		}
+	)
+
+	if doctype == "Facebook Message":
+		row.update({"page_id": channel_doc.account_id, "attachment_url": message.get("attachment_url")})
+	else:
+		row.update({"instagram_user_id": channel_doc.account_id, "media_url": message.get("attachment_url")})
+
+	return row
+
+
+def ingest_messages(messages, channel_doc) -> dict:
+	"""Store a chunk of platform messages with a fixed number of queries
+
+	Conversations are resolved with one IN lookup and the missing ones are
+	created in bulk, messages are bulk inserted without document hooks and
+	lead creation for them is deferred to a background job.
+	"""
+	if not messages:
+		return {"messages": 0, "conversations": 0}
+
+	doctype = MESSAGE_DOCTYPES[channel_doc.platform]
+	conversations = resolve_conversations(messages, channel_doc)
+
+	rows = []
+	for message in messages:
+		row = build_message_row(message, channel_doc)
+
+		if "conversation_id" in row:
+			row["conversation_id"] = conversations.get(row["conversation_id"], row["conversation_id"])
+
+		rows.append(row)
+
+	# Webhook retries and overlapping syncs deliver the same ids again
+	rows = filter_new_messages(doctype, rows)
+	names = bulk_insert_rows(doctype, rows)
+	if not names:
+		return {"messages": 0, "conversations": len(conversations)}
+
+	# Side effects only for rows that landed, a racing worker may have stored the rest
+	stored = set(names)
+	rows = [row for row in rows if row["name"] in stored]
+
+	index_message_rows(doctype, rows)
+	update_conversation_counters(rows)
+
+	# Side effects run after the chunk is committed, outside the ingestion path
+	queue_lead_creation(names)
+
+	return {"messages": len(names), "conversations": len(conversations)}
+
+
+def resolve_conversations(messages, channel_doc) -> dict:
+	"""Map platform conversation ids to Conversation names, creating missing ones in bulk"""
+	threads = {}
+	for message in messages:
+		external_id = message.get("conversation_id")
+		if not external_id:
+			continue
+
+		thread = threads.setdefault(
+			external_id, {"participants": message.get("participants") or "", "last_message_time": None}
+		)
+
+		timestamp = to_system_datetime(message.get("created_time"))
+		if not thread["last_message_time"] or timestamp > thread["last_message_time"]:
+			thread["last_message_time"] = timestamp
+
+	if not threads:
+		return {}
+
+	conversations = dict(
+		frappe.get_all(
+			"Conversation",
+			filters={"channel": channel_doc.name, "external_id": ["in", list(threads)]},
+			fields=["external_id", "name"],
+			as_list=True,
+		)
+	)
+
+	missing = [external_id for external_id in threads if external_id not in conversations]
+
+	rows = [
+		{
+			"channel": channel_doc.name,
+			"external_id": external_id,
+			"participants": threads[external_id]["participants"],
+			"subject": f"Conversation with {threads[external_id]['participants']}"
+			if threads[external_id]["participants"]
+			else None,
+			"status": "Open",
+			"priority": "Medium",
+			"last_message_time": threads[external_id]["last_message_time"],
+		}
+		for external_id in missing
+	]
+
+	stored = set(bulk_insert_rows("Conversation", rows))
+	conversations.update({row["external_id"]: row["name"] for row in rows if row["name"] in stored})
+
+	return conversations
+
+
+def bulk_insert_rows(doctype, rows) -> list:
+	"""Insert rows with one statement per chunk, skipping document hooks
+
+	Rows clashing with a unique key (e.g. a message id stored meanwhile by
+	another worker) are skipped by the database; only the names of the rows
+	that were actually stored are returned.
+	"""
+	if not rows:
+		return []
+
+	now = frappe.utils.now()
+	user = frappe.session.user
+	series = get_naming_series(doctype)
+	names = reserve_names(doctype, len(rows))
+
+	for name, row in zip(names, rows, strict=True):
+		row.update(
+			{
+				"name": name,
+				"naming_series": series,
+				"creation": now,
+				"modified": now,
+				"owner": user,
+				"modified_by": user,
+			}
+		)
+
+	fields = list(rows[0])
+	frappe.db.bulk_insert(
+		doctype, fields, [[row.get(field) for field in fields] for row in rows], ignore_duplicates=True
+	)
+
+	# Reserved names are unique, so the ones found are exactly the rows that landed
+	stored = set(frappe.get_all(doctype, filters={"name": ["in", names]}, pluck="name"))
+	return [name for name in names if name in stored]
+
+
+def reserve_names(doctype, count) -> list:
+	"""Reserve a block of names from the DocType's naming series with a single update"""
+	prefix = parse_naming_series(get_naming_series(doctype))
+
+	current = frappe.db.sql("select `current` from `tabSeries` where `name`=%s for update", prefix)
+
+	if current and current[0][0] is not None:
+		start = current[0][0]
+		frappe.db.sql("update `tabSeries` set `current` = `current` + %s where `name`=%s", (count, prefix))
+	else:
+		start = 0
+		frappe.db.sql("insert into `tabSeries` (`name`, `current`) values (%s, %s)", (prefix, count))
+
+	# Same shape as naming_series autoname, which appends .#####
+	return [f"{prefix}{n:05d}" for n in range(start + 1, start + count + 1)]
+
+
+def get_naming_series(doctype):
+	"""Default naming series of a DocType"""
+	return frappe.get_meta(doctype).get_field("naming_series").options.split("\n")[0]
+
+
+def to_system_datetime(value):
+	"""Convert Graph timestamps (epoch seconds/milliseconds or ISO 8601) to system time"""
+	if not value:
+		return frappe.utils.now_datetime()
+
+	if isinstance(value, int | float) or str(value).isdigit():
+		value = int(value)
+		# Messenger sends milliseconds, WhatsApp seconds
+		if value > 10**11:
+			value = value / 1000
+		utc = datetime.fromtimestamp(value, tz=timezone.utc)
+	else:
+		utc = get_datetime(value)
+		if utc.tzinfo:
+			utc = utc.astimezone(timezone.utc)
+		else:
+			return utc
+
+	return convert_utc_to_system_timezone(utc.replace(tzinfo=None)).replace(tzinfo=None)
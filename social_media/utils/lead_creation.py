@@ -1,108 +1,330 @@
+import time
+from functools import partial
+
 import frappe
 from frappe import _
 
+from social_media.config import get_setting
+from social_media.utils import chunked
+from social_media.utils.identity import get_identity_lead, get_identity_leads, save_identities
+from social_media.utils.message_index import INDEX_SOURCES, set_index_leads, set_leads
+from social_media.utils.phone import find_leads_by_phone, normalize_phone
+
+# Last Social Message processed by the batch lead engine
+LEAD_CHECKPOINT_KEY = "social_media_lead_checkpoint"
+
+# Redis buffer of message names waiting for the deferred lead job
+LEAD_QUEUE_KEY = "social_media:lead_queue"
+LEAD_QUEUE_JOB_ID = "social_media_flush_lead_queue"
+
 
 def create_lead_from_message(message_doc):
 	"""Create Lead from social media message"""
-	
+
 	# Check if lead already exists for this contact
 	existing_lead = None
-	
+
 	if message_doc.doctype == "WhatsApp Message":
-		existing_lead = frappe.db.exists("Lead", {"whatsapp_no": message_doc.phone_number})
-		if not existing_lead:
-			existing_lead = frappe.db.exists("Lead", {"mobile_no": message_doc.phone_number})
-	
+		existing_lead = find_leads_by_phone([message_doc.phone_number]).get(message_doc.phone_number)
+
 	elif message_doc.doctype in ["Facebook Message", "Instagram Message"]:
-		# Check by sender_id or create custom field for social media IDs
-		pass
-	
+		existing_lead = get_identity_lead(*get_identity(message_doc))
+
 	if existing_lead:
+		message_doc.db_set("lead", existing_lead)
+		set_index_leads({message_doc.name: existing_lead})
 		return existing_lead
-	
+
 	# Create new lead
+	lead = make_lead(
+		message_doc.doctype,
+		message_doc.phone_number if message_doc.doctype == "WhatsApp Message" else message_doc.sender_id,
+		message_doc.get("contact_name")
+	)
+
+	lead.insert(ignore_permissions=True)
+
+	# Link message to lead
+	message_doc.db_set("lead", lead.name)
+	set_index_leads({message_doc.name: lead.name})
+
+	if message_doc.doctype in ["Facebook Message", "Instagram Message"]:
+		save_identities({get_identity(message_doc): lead.name})
+
+	return lead.name
+
+
+def make_lead(doctype, sender, contact_name=None):
+	"""New (unsaved) Lead for the sender of a message of the given DocType"""
 	lead = frappe.new_doc("Lead")
-	
+
 	# Set basic info based on message type
-	if message_doc.doctype == "WhatsApp Message":
+	if doctype == "WhatsApp Message":
 		lead.update({
-			"first_name": message_doc.contact_name or "WhatsApp Contact",
-			"whatsapp_no": message_doc.phone_number,
-			"mobile_no": message_doc.phone_number,
+			"first_name": contact_name or "WhatsApp Contact",
+			"whatsapp_no": normalize_phone(sender),
+			"mobile_no": normalize_phone(sender),
 			"source": "WhatsApp"
 		})
-	
-	elif message_doc.doctype == "Facebook Message":
+
+	elif doctype == "Facebook Message":
 		lead.update({
-			"first_name": f"Facebook User {message_doc.sender_id}",
+			"first_name": f"Facebook User {sender}",
 			"source": "Facebook"
 		})
-	
-	elif message_doc.doctype == "Instagram Message":
+
+	elif doctype == "Instagram Message":
 		lead.update({
-			"first_name": f"Instagram User {message_doc.sender_id}",
+			"first_name": f"Instagram User {sender}",
 			"source": "Instagram"
 		})
-	
+
 	# Common fields
 	lead.update({
 		"status": "Lead",
 		"lead_owner": frappe.session.user,
 		"company": frappe.defaults.get_user_default("Company")
 	})
-	
-	lead.insert(ignore_permissions=True)
-	
-	# Link message to lead
-	message_doc.db_set("lead", lead.name)
-	
-	return lead.name
 
+	return lead
 
-@frappe.whitelist()
-def auto_create_leads_from_messages():
-	"""Background job to create leads from unprocessed messages"""
-	
-	# Get unprocessed WhatsApp messages
-	wa_messages = frappe.get_all(
-		"WhatsApp Message",
-		filters={"lead": ["is", "not set"]},
-		fields=["name"]
-	)
-	
-	for msg in wa_messages:
-		message_doc = frappe.get_doc("WhatsApp Message", msg.name)
-		try:
-			create_lead_from_message(message_doc)
-		except Exception as e:
-			frappe.log_error(f"Auto lead creation failed for {msg.name}: {str(e)}")
-	
-	# Get unprocessed Facebook messages
-	fb_messages = frappe.get_all(
-		"Facebook Message",
-		filters={"lead": ["is", "not set"]},
-		fields=["name"]
+
+def queue_lead_creation(names):
+	"""Queue messages for lead creation once the current transaction commits
+
+	Names are buffered in Redis and drained by a single deduplicated job, so
+	a burst of messages from one sender ends up as one lead in one job.
+	"""
+	if names:
+		frappe.db.after_commit.add(partial(push_lead_queue, list(names)))
+
+
+def push_lead_queue(names):
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.rpush(cache.make_key(LEAD_QUEUE_KEY), *names)
+	pipe.execute()
+
+	frappe.enqueue(
+		"social_media.utils.lead_creation.flush_lead_queue",
+		queue="default",
+		job_id=LEAD_QUEUE_JOB_ID,
+		deduplicate=True
 	)
-	
-	for msg in fb_messages:
-		message_doc = frappe.get_doc("Facebook Message", msg.name)
-		try:
-			create_lead_from_message(message_doc)
-		except Exception as e:
-			frappe.log_error(f"Auto lead creation failed for {msg.name}: {str(e)}")
-	
-	# Get unprocessed Instagram messages
-	ig_messages = frappe.get_all(
-		"Instagram Message",
-		filters={"lead": ["is", "not set"]},
-		fields=["name"]
+
+
+def flush_lead_queue():
+	"""Background job creating leads for everything buffered by queue_lead_creation"""
+	# Let the rest of the burst land before draining
+	time.sleep(get_setting("lead_coalesce_window"))
+
+	cache = frappe.cache()
+	key = cache.make_key(LEAD_QUEUE_KEY)
+	table = frappe.qb.DocType("Social Message")
+
+	while True:
+		# Read and clear atomically, names pushed meanwhile go to the next round
+		pipe = cache.pipeline()
+		pipe.lrange(key, 0, -1)
+		pipe.delete(key)
+		names = list({name.decode() for name in pipe.execute()[0]})
+		if not names:
+			# A push racing the drain above found this job still running and queued
+			# no new one, so look at the buffer once more before exiting
+			if cache.pipeline().llen(key).execute()[0]:
+				continue
+			break
+
+		for chunk in chunked(names, get_setting("lead_batch_size")):
+			try:
+				link_leads(
+					get_pending_messages_query("Social Message")
+					.select(table.name, table.message_doctype, table.platform, table.account, table.sender)
+					.where(table.name.isin(chunk))
+					.run(as_dict=True)
+				)
+				frappe.db.commit()
+			except Exception as e:
+				# The hourly run picks these messages up again
+				frappe.db.rollback()
+				frappe.log_error(f"Deferred lead creation failed: {str(e)}")
+
+
+def get_pending_messages_query(doctype):
+	"""Query for messages not linked to a lead yet
+
+	Written as an explicit null/empty check so the lead index is used,
+	a "not set" filter compiles to ifnull(lead, '') = '' which scans the table.
+	Messages without a sender and the account's own messages never get a lead,
+	so they are left out instead of being picked up again on every run.
+	"""
+	table = frappe.qb.DocType(doctype)
+	columns = INDEX_SOURCES.get(doctype, {"sender": "sender", "account": "account"})
+	sender = table[columns["sender"]]
+
+	query = (
+		frappe.qb.from_(table)
+		.where(table.lead.isnull() | (table.lead == ""))
+		.where(sender.notnull() & (sender != ""))
 	)
-	
-	for msg in ig_messages:
-		message_doc = frappe.get_doc("Instagram Message", msg.name)
+	if columns["account"]:
+		account = table[columns["account"]]
+		query = query.where(account.isnull() | (sender != account))
+
+	return query
+
+
+@frappe.whitelist()
+def auto_create_leads_from_messages():
+	"""Background job to create leads from unprocessed messages
+
+	Works through the Social Message index in bounded chunks ordered by name.
+	The last processed name is kept as a checkpoint, so an interrupted run
+	resumes where it stopped. Once the backlog is drained the checkpoint is
+	reset and messages that failed earlier are retried on the next run.
+	"""
+	chunk_size = get_setting("lead_batch_size")
+	table = frappe.qb.DocType("Social Message")
+
+	processed = 0
+	while True:
+		checkpoint = frappe.db.get_global(LEAD_CHECKPOINT_KEY) or ""
+
+		messages = (
+			get_pending_messages_query("Social Message")
+			.select(table.name, table.message_doctype, table.platform, table.account, table.sender)
+			.where(table.name > checkpoint)
+			.orderby(table.name)
+			.limit(chunk_size)
+			.run(as_dict=True)
+		)
+		if not messages:
+			frappe.db.set_global(LEAD_CHECKPOINT_KEY, "")
+			break
+
 		try:
-			create_lead_from_message(message_doc)
+			link_leads(messages)
 		except Exception as e:
-			frappe.log_error(f"Auto lead creation failed for {msg.name}: {str(e)}")
-	
-	return {"success": True, "message": "Auto lead creation completed"}
\ No newline at end of file
+			frappe.db.rollback()
+			frappe.log_error(f"Auto lead creation failed for chunk after {checkpoint}: {str(e)}")
+
+		frappe.db.set_global(LEAD_CHECKPOINT_KEY, messages[-1].name)
+		frappe.db.commit()
+		processed += len(messages)
+
+	return {"success": True, "message": f"Auto lead creation completed for {processed} messages"}
+
+
+def link_leads(messages):
+	"""Link a chunk of Social Message rows to leads with a fixed number of queries
+
+	Senders are collapsed in memory, existing leads are resolved with one IN
+	query per source and the lead links are written with one UPDATE per table.
+	"""
+	if not messages:
+		return {}
+
+	# Keyed on (doctype, account, sender); a page's own messages need no lead
+	senders = {}
+	for message in messages:
+		if message.sender and message.sender != message.account:
+			senders.setdefault((message.message_doctype, message.account, message.sender), []).append(message.name)
+
+	leads = find_existing_leads(senders)
+
+	contact_names = get_contact_names([
+		name for key, names in senders.items()
+		if key[0] == "WhatsApp Message" and key not in leads
+		for name in names
+	])
+
+	# One Lead document per new sender, so Lead validations and hooks still run
+	created = {}
+	for key, names in senders.items():
+		if key not in leads:
+			lead = make_lead(key[0], key[2], next((contact_names[n] for n in names if contact_names.get(n)), None))
+			lead.insert(ignore_permissions=True)
+			leads[key] = created[key] = lead.name
+
+	save_identities({
+		(INDEX_SOURCES[doctype]["platform"], account, sender): lead
+		for (doctype, account, sender), lead in created.items()
+		if doctype != "WhatsApp Message"
+	})
+
+	links = {
+		name: leads[key]
+		for key, names in senders.items()
+		for name in names
+	}
+
+	by_doctype = {}
+	for message in messages:
+		if message.name in links:
+			by_doctype.setdefault(message.message_doctype, {})[message.name] = links[message.name]
+
+	for doctype, doctype_links in by_doctype.items():
+		set_leads(doctype, doctype_links)
+
+	set_index_leads(links)
+
+	return links
+
+
+def find_existing_leads(senders) -> dict:
+	"""Resolve (doctype, account, sender) keys to existing leads"""
+	leads = {}
+
+	# Facebook/Instagram senders through their Social Identity
+	identities = {
+		(INDEX_SOURCES[doctype]["platform"], account, sender): (doctype, account, sender)
+		for doctype, account, sender in senders
+		if doctype != "WhatsApp Message"
+	}
+	for identity, lead in get_identity_leads(identities).items():
+		leads[identities[identity]] = lead
+
+	# Senders linked before identities were recorded, remembered from now on
+	unresolved = {key for key in identities.values() if key not in leads}
+	if unresolved:
+		linked = {}
+		for row in frappe.get_all(
+			"Social Message",
+			filters={"sender": ["in", [sender for _doctype, _account, sender in unresolved]], "lead": ["is", "set"]},
+			fields=["message_doctype", "account", "sender", "lead"]
+		):
+			key = (row.message_doctype, row.account, row.sender)
+			if key in unresolved and key not in linked:
+				linked[key] = row.lead
+
+		leads.update(linked)
+		save_identities({
+			(INDEX_SOURCES[doctype]["platform"], account, sender): lead
+			for (doctype, account, sender), lead in linked.items()
+		})
+
+	# WhatsApp numbers of CRM leads or of contacts linked to one, compared in E.164 form
+	phones = [sender for doctype, account, sender in senders if doctype == "WhatsApp Message"]
+	for phone, lead in find_leads_by_phone(phones).items():
+		leads.setdefault(("WhatsApp Message", None, phone), lead)
+
+	return leads
+
+
+def get_identity(message_doc):
+	"""(platform, page_id, sender_id) of a Facebook/Instagram message"""
+	source = INDEX_SOURCES[message_doc.doctype]
+	return (source["platform"], message_doc.get(source["account"]), message_doc.sender_id)
+
+
+def get_contact_names(names) -> dict:
+	"""WhatsApp contact names of the given messages, which the index does not hold"""
+	if not names:
+		return {}
+
+	return dict(frappe.get_all(
+		"WhatsApp Message",
+		filters={"name": ["in", names]},
+		fields=["name", "contact_name"],
+		as_list=True
+	))
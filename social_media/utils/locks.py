@@ -0,0 +1,25 @@
+import frappe
+
+# Delete the lock only if it still holds our token, so an expired lock taken over by another run is kept
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+	return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def acquire_lock(key, timeout):
+	"""Take a Redis lock shared by all workers, returns its token or None when it is held"""
+	token = frappe.generate_hash(length=16)
+	cache = frappe.cache()
+
+	if cache.set(cache.make_key(key), token, nx=True, ex=timeout):
+		return token
+
+	return None
+
+
+def release_lock(key, token):
+	cache = frappe.cache()
+	cache.eval(RELEASE_SCRIPT, 1, cache.make_key(key), token)
@@ -0,0 +1,193 @@
+import frappe
+from frappe.query_builder import Case
+
+PREVIEW_LENGTH = 140
+
+# Cached get_lead_stats result, dropped whenever indexed messages or their leads change
+LEAD_STATS_CACHE_KEY = "social_media:lead_stats"
+
+# Social Message columns and the source column of each message DocType (None when it has no such column)
+INDEX_SOURCES = {
+	"Facebook Message": {
+		"platform": "Facebook",
+		"sender": "sender_id",
+		"recipient": "recipient_id",
+		"conversation": "conversation_id",
+		"account": "page_id",
+		"status": "status",
+	},
+	"Instagram Message": {
+		"platform": "Instagram",
+		"sender": "sender_id",
+		"recipient": "recipient_id",
+		"conversation": "conversation_id",
+		"account": "instagram_user_id",
+		"status": "status",
+	},
+	"WhatsApp Message": {
+		"platform": "WhatsApp",
+		"sender": "phone_number",
+		"recipient": None,
+		"conversation": None,
+		"account": None,
+		"status": None,
+	},
+}
+
+INDEX_COLUMNS = ["sender", "recipient", "conversation", "account", "status"]
+
+
+def build_index_row(doctype, message) -> dict:
+	"""Map a message (document or row dict) to its Social Message columns"""
+	source = INDEX_SOURCES[doctype]
+
+	row = {
+		"message_doctype": doctype,
+		"message_name": message.get("name"),
+		"platform": source["platform"],
+		"timestamp": message.get("timestamp"),
+		"lead": message.get("lead"),
+		"preview": (message.get("message_content") or "")[:PREVIEW_LENGTH],
+	}
+
+	for column in INDEX_COLUMNS:
+		row[column] = message.get(source[column]) if source[column] else None
+
+	return row
+
+
+def index_message_rows(doctype, messages):
+	"""Add freshly bulk inserted messages to the index with one statement"""
+	if not messages:
+		return
+
+	now = frappe.utils.now()
+	user = frappe.session.user
+
+	rows = []
+	for message in messages:
+		row = build_index_row(doctype, message)
+		row.update(
+			{
+				"name": row["message_name"],
+				"creation": now,
+				"modified": now,
+				"owner": user,
+				"modified_by": user,
+			}
+		)
+		rows.append(row)
+
+	fields = list(rows[0])
+	frappe.db.bulk_insert(
+		"Social Message", fields, [[row[field] for field in fields] for row in rows], ignore_duplicates=True
+	)
+	clear_lead_stats_cache()
+
+
+def sync_message_index(doc, method=None):
+	"""doc_events hook keeping the index row of a message document up to date"""
+	row = build_index_row(doc.doctype, doc)
+
+	if frappe.db.exists("Social Message", doc.name):
+		frappe.db.set_value("Social Message", doc.name, row)
+		if doc.has_value_changed("lead"):
+			clear_lead_stats_cache()
+	else:
+		index_message_rows(doc.doctype, [doc])
+
+
+def remove_from_message_index(doc, method=None):
+	"""doc_events hook dropping the index row of a deleted message"""
+	frappe.db.delete("Social Message", {"name": doc.name})
+	clear_lead_stats_cache()
+
+
+def set_index_leads(links):
+	"""Mirror lead links set without hooks (db_set, bulk updates) onto the index"""
+	set_leads("Social Message", links)
+	clear_lead_stats_cache()
+
+
+def set_leads(doctype, links):
+	"""Set the lead of many rows, given as {name: lead}, in a single UPDATE"""
+	if not links:
+		return
+
+	table = frappe.qb.DocType(doctype)
+	lead = Case()
+	for name, lead_name in links.items():
+		lead = lead.when(table.name == name, lead_name)
+
+	frappe.qb.update(table).set(table.lead, lead).where(table.name.isin(list(links))).run()
+
+
+def clear_lead_stats_cache():
+	frappe.cache().delete_value(LEAD_STATS_CACHE_KEY)
+
+
+def rebuild_message_index(chunk_size=10000):
+	"""Rebuild the index from the message tables, one chunk of names per statement"""
+	for doctype, source in INDEX_SOURCES.items():
+		select = ", ".join(
+			[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"%(doctype)s",
+				"name",
+				"%(platform)s",
+				"`timestamp`",
+				"`lead`",
+				f"substring(message_content, 1, {PREVIEW_LENGTH})",
+			]
+			+ [f"`{source[column]}`" if source[column] else "null" for column in INDEX_COLUMNS]
+		)
+
+		last = ""
+		while True:
+			names = frappe.db.sql_list(
+				f"select name from `tab{doctype}` where name > %s order by name limit %s", (last, chunk_size)
+			)
+			if not names:
+				break
+
+			params = {"doctype": doctype, "platform": source["platform"], "names": tuple(names)}
+			frappe.db.sql("delete from `tabSocial Message` where name in %(names)s", params)
+			frappe.db.sql(
+				f"""insert into `tabSocial Message`
+					(name, creation, modified, owner, modified_by, message_doctype, message_name,
+					platform, `timestamp`, `lead`, preview, {", ".join(f"`{column}`" for column in INDEX_COLUMNS)})
+				select {select} from `tab{doctype}` where name in %(names)s""",
+				params,
+			)
+			frappe.db.commit()
+			last = names[-1]
+
+		# Drop index rows of messages deleted without hooks
+		frappe.db.sql(
+			f"""delete from `tabSocial Message` where message_doctype = %s
+				and message_name not in (select name from `tab{doctype}`)""",
+			doctype,
+		)
+		frappe.db.commit()
+
+	clear_lead_stats_cache()
+
+
+@frappe.whitelist()
+def enqueue_rebuild_message_index():
+	"""Rebuild the Social Message index in the background"""
+	frappe.only_for("System Manager")
+
+	frappe.enqueue(
+		"social_media.utils.message_index.rebuild_message_index",
+		queue="long",
+		timeout=3600,
+		job_id="rebuild_social_message_index",
+		deduplicate=True,
+	)
+
+	return {"success": True, "message": "Social Message index rebuild queued"}
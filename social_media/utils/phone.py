@@ -0,0 +1,183 @@
+import re
+
+import frappe
+import phonenumbers
+
+from social_media.config import get_setting
+
+# Phone fields indexed per DocType, in matching precedence; Contact numbers also live in phone_nos
+PHONE_FIELDS = {"Lead": ["whatsapp_no", "mobile_no", "phone"], "Contact": ["mobile_no", "phone_nos"]}
+
+
+def normalize_phone(number, region=None):
+	"""E.164 form of a phone number, e.g. "+880 1712-345678" -> "+8801712345678"
+
+	Numbers without a country code are read in the default region. Numbers
+	that cannot be parsed fall back to their digits with a leading +.
+	"""
+	if not number:
+		return None
+
+	number = str(number).strip()
+	if number.startswith("00"):
+		number = f"+{number[2:]}"
+
+	try:
+		parsed = phonenumbers.parse(
+			number, None if number.startswith("+") else (region or get_default_region())
+		)
+		if phonenumbers.is_possible_number(parsed):
+			return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+	except phonenumbers.NumberParseException:
+		pass
+
+	digits = re.sub(r"\D", "", number)
+	return f"+{digits}" if digits else None
+
+
+def get_default_region():
+	"""Region for numbers stored without a country code, from site config or the system country"""
+	region = get_setting("default_phone_region")
+	if region:
+		return region
+
+	country = frappe.db.get_default("country")
+	if not country:
+		return None
+
+	return (frappe.get_cached_value("Country", country, "code") or "").upper() or None
+
+
+def find_by_phone(phones, doctype="Lead") -> dict:
+	"""Map numbers to documents of a DocType holding them, with one indexed IN probe"""
+	region = get_default_region()
+	normalized = {phone: normalize_phone(phone, region) for phone in phones if phone}
+	if not normalized:
+		return {}
+
+	precedence = PHONE_FIELDS[doctype]
+	matches = {}
+	for row in sorted(
+		frappe.get_all(
+			"Social Phone Lookup",
+			filters={"phone": ["in", list(set(normalized.values()))], "reference_doctype": doctype},
+			fields=["phone", "reference_name", "fieldname"],
+		),
+		key=lambda row: precedence.index(row.fieldname) if row.fieldname in precedence else len(precedence),
+	):
+		matches.setdefault(row.phone, row.reference_name)
+
+	return {phone: matches[value] for phone, value in normalized.items() if value in matches}
+
+
+def find_leads_by_phone(phones) -> dict:
+	"""Map numbers to the Lead holding them, or else to the Lead linked to a Contact holding them"""
+	leads = find_by_phone(phones)
+
+	contacts = find_by_phone([phone for phone in phones if phone not in leads], "Contact")
+	if contacts:
+		contact_leads = {}
+		for row in frappe.get_all(
+			"Dynamic Link",
+			filters={
+				"parenttype": "Contact",
+				"parent": ["in", list(set(contacts.values()))],
+				"link_doctype": "Lead",
+			},
+			fields=["parent", "link_name"],
+			order_by="idx asc",
+		):
+			contact_leads.setdefault(row.parent, row.link_name)
+
+		leads.update(
+			{phone: contact_leads[contact] for phone, contact in contacts.items() if contact in contact_leads}
+		)
+
+	return leads
+
+
+def get_document_phones(doc) -> list:
+	"""(fieldname, normalized number) pairs of a Lead or Contact"""
+	region = get_default_region()
+	phones = []
+	for fieldname in PHONE_FIELDS[doc.doctype]:
+		if fieldname == "phone_nos":
+			values = [row.phone for row in doc.get("phone_nos") or []]
+		else:
+			values = [doc.get(fieldname)]
+
+		phones.extend((fieldname, normalize_phone(value, region)) for value in values)
+
+	return list(dict.fromkeys(phone for phone in phones if phone[1]))
+
+
+def sync_phone_lookup(doc, method=None):
+	"""doc_events hook replacing the lookup rows of a Lead or Contact"""
+	remove_phone_lookup(doc)
+	insert_phone_lookup(
+		[(doc.doctype, doc.name, fieldname, phone) for fieldname, phone in get_document_phones(doc)]
+	)
+
+
+def remove_phone_lookup(doc, method=None):
+	frappe.db.delete("Social Phone Lookup", {"reference_doctype": doc.doctype, "reference_name": doc.name})
+
+
+def insert_phone_lookup(rows):
+	"""Insert (reference_doctype, reference_name, fieldname, phone) rows in one statement"""
+	if not rows:
+		return
+
+	now = frappe.utils.now()
+	user = frappe.session.user
+
+	frappe.db.bulk_insert(
+		"Social Phone Lookup",
+		[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"reference_doctype",
+			"reference_name",
+			"fieldname",
+			"phone",
+		],
+		[[frappe.generate_hash(length=10), now, now, user, user, *row] for row in rows],
+	)
+
+
+def rebuild_phone_lookup(chunk_size=5000):
+	"""Rebuild the lookup for every Lead and Contact, one chunk per commit"""
+	frappe.db.delete("Social Phone Lookup")
+	region = get_default_region()
+
+	for doctype, fields in PHONE_FIELDS.items():
+		last = ""
+		while True:
+			names = frappe.get_all(
+				doctype, filters={"name": [">", last]}, order_by="name asc", limit=chunk_size, pluck="name"
+			)
+			if not names:
+				break
+
+			columns = [fieldname for fieldname in fields if fieldname != "phone_nos"]
+			rows = []
+			for record in frappe.get_all(doctype, filters={"name": ["in", names]}, fields=["name", *columns]):
+				rows.extend(
+					(doctype, record.name, fieldname, normalize_phone(record[fieldname], region))
+					for fieldname in columns
+				)
+
+			if "phone_nos" in fields:
+				for row in frappe.get_all(
+					"Contact Phone",
+					filters={"parenttype": doctype, "parent": ["in", names]},
+					fields=["parent", "phone"],
+				):
+					rows.append((doctype, row.parent, "phone_nos", normalize_phone(row.phone, region)))
+
+			insert_phone_lookup(list(dict.fromkeys(row for row in rows if row[3])))
+			frappe.db.commit()
+			last = names[-1]
@@ -0,0 +1,80 @@
+import frappe
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
+
+from social_media.config import get_setting
+
+# Platforms whose connector can list messages
+POLLED_PLATFORMS = ["Facebook", "Instagram"]
+
+
+def schedule_channel_syncs():
+	"""Scheduler job starting a sync run for the channels due for a poll
+
+	Each channel keeps its own poll interval and next poll time. Channels that
+	received webhooks recently are up to date already and are not polled until
+	the webhooks go quiet.
+	"""
+	now = now_datetime()
+	quiet_period = get_setting("sync_webhook_quiet_period")
+
+	due = frappe.get_all(
+		"Social Media Channel",
+		filters={"status": "Active", "platform": ["in", POLLED_PLATFORMS]},
+		or_filters=[["next_poll_at", "is", "not set"], ["next_poll_at", "<=", now]],
+		fields=["name", "poll_interval", "last_webhook_at"],
+	)
+
+	channels = []
+	for channel in due:
+		if channel.last_webhook_at and get_datetime(channel.last_webhook_at) > add_to_date(
+			now, seconds=-quiet_period
+		):
+			# Look again once the webhooks could have gone quiet
+			set_next_poll(channel.name, add_to_date(channel.last_webhook_at, seconds=quiet_period))
+			continue
+
+		# Held back until the run reschedules it, so a queued channel is not started twice
+		set_next_poll(channel.name, add_to_date(now, seconds=get_setting("sync_lock_timeout")))
+		channels.append(channel.name)
+
+	if channels:
+		from social_media.api_social import start_sync_run
+
+		start_sync_run(channels)
+
+
+def reschedule_channel(channel, new_messages, failed=False):
+	"""Halve the poll interval of a channel that had new messages, double it when idle
+
+	A failed sync says nothing about the channel's activity, so its interval is kept.
+	"""
+	interval = cint(frappe.db.get_value("Social Media Channel", channel, "poll_interval"))
+
+	if failed:
+		interval = interval or get_setting("sync_min_interval")
+	elif new_messages:
+		interval = interval // 2
+	else:
+		interval = interval * 2 or get_setting("sync_min_interval")
+
+	interval = min(max(interval, get_setting("sync_min_interval")), get_setting("sync_max_interval"))
+
+	frappe.db.set_value(
+		"Social Media Channel",
+		channel,
+		{"poll_interval": interval, "next_poll_at": add_to_date(now_datetime(), seconds=interval)},
+		update_modified=False,
+	)
+
+
+def record_webhook_activity(channels):
+	"""Mark channels as fed by webhooks, with one UPDATE per delivery"""
+	if not channels:
+		return
+
+	table = frappe.qb.DocType("Social Media Channel")
+	frappe.qb.update(table).set(table.last_webhook_at, now_datetime()).where(table.name.isin(channels)).run()
+
+
+def set_next_poll(channel, next_poll_at):
+	frappe.db.set_value("Social Media Channel", channel, "next_poll_at", next_poll_at, update_modified=False)
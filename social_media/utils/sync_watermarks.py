@@ -0,0 +1,58 @@
+import frappe
+
+from social_media.utils.ingestion import to_system_datetime
+
+
+def get_conversation_watermarks(channel, external_ids) -> dict:
+	"""Stored sync watermarks of a page of platform conversations, keyed by external id"""
+	if not external_ids:
+		return {}
+
+	return {
+		row.external_id: row
+		for row in frappe.get_all(
+			"Conversation",
+			filters={"channel": channel, "external_id": ["in", list(external_ids)]},
+			fields=["external_id", "platform_updated_time", "last_synced_time", "last_synced_message_id"],
+		)
+	}
+
+
+def has_new_activity(conversation, watermark) -> bool:
+	"""Whether the platform updated a conversation after it was last synced"""
+	if not (watermark and watermark.platform_updated_time and conversation.get("updated_time")):
+		return True
+
+	return to_system_datetime(conversation["updated_time"]) > watermark.platform_updated_time
+
+
+def is_synced(message, watermark) -> bool:
+	"""Whether a message, read newest first, is at or behind the conversation's watermark"""
+	if not watermark:
+		return False
+
+	if watermark.last_synced_message_id and message.get("id") == watermark.last_synced_message_id:
+		return True
+
+	# Messages from the watermark's second are read again and dropped by deduplication
+	return (
+		bool(watermark.last_synced_time)
+		and to_system_datetime(message.get("created_time")) < watermark.last_synced_time
+	)
+
+
+def save_conversation_watermarks(channel, watermarks):
+	"""Record how far each fully read conversation has been synced
+
+	watermarks maps external ids to the conversation updated_time and the
+	newest message read, which is None when nothing new was found.
+	"""
+	for external_id, watermark in watermarks.items():
+		frappe.db.sql(
+			"""update `tabConversation` set
+				platform_updated_time = ifnull(%(updated_time)s, platform_updated_time),
+				last_synced_time = ifnull(%(message_time)s, last_synced_time),
+				last_synced_message_id = ifnull(%(message_id)s, last_synced_message_id)
+			where channel = %(channel)s and external_id = %(external_id)s""",
+			dict(watermark, channel=channel, external_id=external_id),
+		)
@@ -0,0 +1,57 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.social_media.doctype.send_message.send_message import SendMessage
+from social_media.utils.broadcast import (
+	create_broadcast,
+	get_progress,
+	resume_broadcasts,
+	send_broadcast_shard,
+)
+
+
+def fake_deliver(message):
+	if message.recipient.endswith("0"):
+		return {"success": False, "error": "Recipient unreachable"}
+
+	return {"success": True, "message_id": f"wamid.{message.recipient}"}
+
+
+@patch.dict(frappe.conf, {"social_media_broadcast_concurrency": 3, "social_media_broadcast_chunk_size": 4})
+@patch("social_media.utils.broadcast.get_rate_limiter")
+@patch("frappe.enqueue")
+class TestBroadcast(FrappeTestCase):
+	def setUp(self):
+		self.recipients = [f"+88017000010{i:02d}" for i in range(10)]
+
+	@patch.object(SendMessage, "deliver", fake_deliver)
+	def test_shards_send_every_recipient_once(self, enqueue, get_rate_limiter):
+		broadcast = create_broadcast("whatsapp", self.recipients + self.recipients[:2], "Hello").name
+
+		self.assertEqual(enqueue.call_count, 3)
+		self.assertEqual(get_progress(broadcast).queued_count, 10)
+
+		for call in enqueue.call_args_list:
+			send_broadcast_shard(call.kwargs["broadcast"], call.kwargs["shard"])
+
+		progress = get_progress(broadcast)
+		self.assertEqual((progress.queued_count, progress.sent_count, progress.failed_count), (0, 9, 1))
+		self.assertEqual(progress.status, "Completed with Errors")
+		self.assertEqual(get_rate_limiter.return_value.wait_if_needed.call_count, 10)
+
+	@patch.object(SendMessage, "deliver", fake_deliver)
+	def test_unfinished_shards_are_resumed(self, enqueue, get_rate_limiter):
+		broadcast = create_broadcast("whatsapp", self.recipients, "Hello").name
+		send_broadcast_shard(broadcast, 0)
+		enqueue.reset_mock()
+
+		with patch("social_media.utils.broadcast.is_job_enqueued", return_value=False):
+			resume_broadcasts([broadcast])
+
+		self.assertEqual(sorted(call.kwargs["shard"] for call in enqueue.call_args_list), [1, 2])
+		self.assertEqual(get_progress(broadcast).status, "Sending")
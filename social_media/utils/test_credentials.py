@@ -0,0 +1,33 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.connectors.meta.facebook import FacebookConnector
+from social_media.tests.utils import make_test_account
+from social_media.utils.credentials import invalidate_credentials
+
+
+class TestCredentialCache(FrappeTestCase):
+	def setUp(self):
+		self.account = make_test_account()
+		invalidate_credentials(self.account.doctype, self.account.name)
+
+	def tearDown(self):
+		# Saved tokens are rolled back, cached ones are not
+		invalidate_credentials(self.account.doctype, self.account.name)
+
+	def test_second_connector_build_runs_no_queries(self):
+		FacebookConnector(self.account).account.get_access_token()
+
+		with self.assertQueryCount(0):
+			connector = FacebookConnector(self.account)
+			self.assertEqual(connector.account.get_access_token(), "test-token")
+
+	def test_saving_the_account_drops_its_cached_token(self):
+		self.assertEqual(self.account.get_access_token(), "test-token")
+
+		self.account.oauth_access_token = "rotated-token"
+		self.account.save()
+
+		self.assertEqual(self.account.get_access_token(), "rotated-token")
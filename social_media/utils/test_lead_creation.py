@@ -0,0 +1,156 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.utils.identity import get_identity_lead
+from social_media.utils.ingestion import bulk_insert_rows
+from social_media.utils.lead_creation import (
+	auto_create_leads_from_messages,
+	flush_lead_queue,
+	get_pending_messages_query,
+	push_lead_queue,
+)
+from social_media.utils.message_index import index_message_rows
+
+
+def make_facebook_messages(page_id, sender_ids):
+	rows = [
+		{
+			"page_id": page_id,
+			"sender_id": sender_id,
+			"recipient_id": page_id,
+			"message_id": frappe.generate_hash(),
+			"message_type": "text",
+			"timestamp": frappe.utils.now_datetime(),
+		}
+		for sender_id in sender_ids
+	]
+	bulk_insert_rows("Facebook Message", rows)
+	index_message_rows("Facebook Message", rows)
+	return [row["name"] for row in rows]
+
+
+def make_whatsapp_messages(phone_numbers):
+	rows = [
+		{
+			"phone_number": phone_number,
+			"contact_name": "Test Contact",
+			"message_id": frappe.generate_hash(),
+			"message_type": "text",
+			"timestamp": frappe.utils.now_datetime(),
+		}
+		for phone_number in phone_numbers
+	]
+	bulk_insert_rows("WhatsApp Message", rows)
+	index_message_rows("WhatsApp Message", rows)
+	return [row["name"] for row in rows]
+
+
+class TestBatchLeadCreation(FrappeTestCase):
+	def test_senders_are_collapsed_and_existing_leads_reused(self):
+		known, unknown = "+8801700000001", "+8801700000002"
+		existing = frappe.get_doc(
+			{"doctype": "Lead", "first_name": "Known Contact", "whatsapp_no": known}
+		).insert(ignore_permissions=True)
+
+		names = make_whatsapp_messages([known, unknown, unknown, known, unknown])
+		leads_before = frappe.db.count("Lead")
+
+		auto_create_leads_from_messages()
+
+		links = dict(
+			frappe.get_all(
+				"WhatsApp Message", filters={"name": ["in", names]}, fields=["name", "lead"], as_list=True
+			)
+		)
+		self.assertEqual(frappe.db.count("Lead"), leads_before + 1)
+		self.assertEqual({links[names[0]], links[names[3]]}, {existing.name})
+		self.assertEqual(len({links[names[1]], links[names[2]], links[names[4]]}), 1)
+		self.assertEqual(
+			frappe.db.count("Social Message", {"name": ["in", names], "lead": ["is", "not set"]}), 0
+		)
+
+	@patch.dict(frappe.conf, {"social_media_lead_coalesce_window": 0})
+	def test_burst_from_one_sender_creates_one_lead(self):
+		names = make_whatsapp_messages(["+8801700000003"] * 50)
+		leads_before = frappe.db.count("Lead")
+
+		push_lead_queue(names[:25])
+		push_lead_queue(names[25:])
+		flush_lead_queue()
+
+		self.assertEqual(frappe.db.count("Lead"), leads_before + 1)
+		self.assertEqual(
+			len(set(frappe.get_all("WhatsApp Message", filters={"name": ["in", names]}, pluck="lead"))), 1
+		)
+
+	def test_facebook_senders_resolve_through_identity(self):
+		page_id, sender_id = "_test_identity_page", frappe.generate_hash()
+
+		first = make_facebook_messages(page_id, [sender_id, page_id])
+		auto_create_leads_from_messages()
+		lead = frappe.db.get_value("Facebook Message", first[0], "lead")
+
+		self.assertTrue(lead)
+		self.assertFalse(frappe.db.get_value("Facebook Message", first[1], "lead"))
+		self.assertEqual(get_identity_lead("Facebook", page_id, sender_id), lead)
+
+		leads_before = frappe.db.count("Lead")
+		later = make_facebook_messages(page_id, [sender_id])
+		auto_create_leads_from_messages()
+
+		self.assertEqual(frappe.db.count("Lead"), leads_before)
+		self.assertEqual(frappe.db.get_value("Facebook Message", later[0], "lead"), lead)
+
+	def test_identity_misses_are_cached(self):
+		page_id, sender_id = "_test_identity_page", frappe.generate_hash()
+
+		self.assertIsNone(get_identity_lead("Facebook", page_id, sender_id))
+		with self.assertQueryCount(0):
+			self.assertIsNone(get_identity_lead("Facebook", page_id, sender_id))
+
+	def test_unlinkable_messages_are_not_pending(self):
+		page_id = "_test_unlinkable_page"
+		names = make_facebook_messages(page_id, [page_id, ""])
+		table = frappe.qb.DocType("Social Message")
+
+		pending = (
+			get_pending_messages_query("Social Message")
+			.select(table.name)
+			.where(table.name.isin(names))
+			.run(pluck=True)
+		)
+
+		self.assertEqual(pending, [])
+
+	def test_whatsapp_numbers_match_in_any_format(self):
+		existing = frappe.get_doc(
+			{"doctype": "Lead", "first_name": "Formatted Contact", "mobile_no": "+880 1700-000004"}
+		).insert(ignore_permissions=True)
+
+		names = make_whatsapp_messages(["+8801700000004"])
+		auto_create_leads_from_messages()
+
+		self.assertEqual(frappe.db.get_value("WhatsApp Message", names[0], "lead"), existing.name)
+
+	def test_whatsapp_numbers_match_through_a_contact(self):
+		lead = frappe.get_doc({"doctype": "Lead", "first_name": "Contact Lead"}).insert(
+			ignore_permissions=True
+		)
+		frappe.get_doc(
+			{
+				"doctype": "Contact",
+				"first_name": "Linked Contact",
+				"phone_nos": [{"phone": "+880 1700-000006", "is_primary_mobile_no": 1}],
+				"links": [{"link_doctype": "Lead", "link_name": lead.name}],
+			}
+		).insert(ignore_permissions=True)
+
+		names = make_whatsapp_messages(["+8801700000006"])
+		auto_create_leads_from_messages()
+
+		self.assertEqual(frappe.db.get_value("WhatsApp Message", names[0], "lead"), lead.name)
@@ -0,0 +1,117 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from social_media.utils.ingestion import bulk_insert_rows
+from social_media.utils.lead_creation import get_pending_messages_query
+from social_media.utils.message_index import index_message_rows
+
+TEST_ACCOUNT = "_test_plan_account"
+
+
+def explain(query):
+	return frappe.db.sql(f"explain {query}", as_dict=True)
+
+
+class TestQueryPlans(FrappeTestCase):
+	"""Hot messaging queries must be served by an index, not a full table scan"""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+
+		if frappe.db.db_type != "mariadb":
+			raise unittest.SkipTest("query plans are checked on MariaDB only")
+
+		# Enough rows that the optimizer does not prefer scanning a tiny table
+		now = frappe.utils.now_datetime()
+		for doctype, account_field in (
+			("Facebook Message", "page_id"),
+			("Instagram Message", "instagram_user_id"),
+			("WhatsApp Message", "phone_number"),
+		):
+			rows = [
+				{
+					account_field: f"{TEST_ACCOUNT}{i % 5}",
+					"message_id": frappe.generate_hash(),
+					"message_type": "text",
+					"timestamp": frappe.utils.add_to_date(now, seconds=-i),
+					"lead": f"_lead{i}" if i % 10 else None,
+				}
+				for i in range(200)
+			]
+			if doctype != "WhatsApp Message":
+				for row in rows:
+					row.update({"sender_id": "_test_sender", "recipient_id": "_test_recipient"})
+
+			bulk_insert_rows(doctype, rows)
+			index_message_rows(doctype, rows)
+
+		bulk_insert_rows(
+			"Conversation",
+			[
+				{"channel": f"{TEST_ACCOUNT}{i % 5}", "external_id": f"t_{i}", "status": "Open"}
+				for i in range(200)
+			],
+		)
+
+	def assertIndexUsable(self, query, column):
+		"""The filter on column is resolved from an index the optimizer actually picks"""
+		plan = explain(query)
+		indexes = {
+			index.Key_name
+			for index in frappe.db.sql(f"show index from `{plan[0].table}`", as_dict=True)
+			if index.Column_name == column and index.Seq_in_index == 1
+		}
+
+		self.assertNotEqual(plan[0].type, "ALL", f"full scan for: {query}\n{plan}")
+		self.assertIn(plan[0].key, indexes, f"no index on {column} used for: {query}\n{plan}")
+
+	def assertOrderedByIndex(self, query):
+		"""Rows come out of an index in order, without a full scan and filesort"""
+		plan = explain(query)
+
+		self.assertNotEqual(plan[0].type, "ALL", f"full scan for: {query}\n{plan}")
+		self.assertNotIn("filesort", plan[0].Extra or "", f"filesort for: {query}\n{plan}")
+
+	def test_inbox_ordering(self):
+		for doctype in ("Social Message", "Facebook Message", "Instagram Message", "WhatsApp Message"):
+			self.assertOrderedByIndex(
+				frappe.get_all(
+					doctype, fields=["name", "timestamp"], order_by="timestamp desc", limit=20, run=0
+				)
+			)
+
+	def test_account_filters(self):
+		for doctype, account_field in (
+			("Facebook Message", "page_id"),
+			("Instagram Message", "instagram_user_id"),
+			("WhatsApp Message", "phone_number"),
+		):
+			query = frappe.get_all(
+				doctype,
+				filters={account_field: f"{TEST_ACCOUNT}1"},
+				fields=["name", "timestamp"],
+				order_by="timestamp desc",
+				limit=20,
+				run=0,
+			)
+			self.assertIndexUsable(query, account_field)
+			self.assertOrderedByIndex(query)
+
+	def test_pending_leads(self):
+		for doctype in ("Social Message", "Facebook Message", "Instagram Message", "WhatsApp Message"):
+			self.assertIndexUsable(get_pending_messages_query(doctype).select("name").get_sql(), "lead")
+
+	def test_conversation_lookup(self):
+		query = frappe.get_all(
+			"Conversation",
+			filters={"channel": f"{TEST_ACCOUNT}1", "external_id": ["in", ["t_1", "t_2"]]},
+			fields=["external_id", "name"],
+			run=0,
+		)
+		self.assertIndexUsable(query, "channel")
@@ -0,0 +1,60 @@
+# Copyright (c) 2025, Primetechbd and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from social_media.tests.utils import make_test_account
+from social_media.utils.sync_scheduler import (
+	record_webhook_activity,
+	reschedule_channel,
+	schedule_channel_syncs,
+)
+
+
+class TestSyncScheduler(FrappeTestCase):
+	def setUp(self):
+		self.channel = make_test_account().channel
+		frappe.db.set_value(
+			"Social Media Channel",
+			self.channel,
+			{"status": "Active", "poll_interval": 240, "next_poll_at": None, "last_webhook_at": None},
+		)
+
+	def test_interval_shrinks_with_activity_and_backs_off_when_idle(self):
+		intervals = []
+		for new_messages in (5, 0, 0, 0):
+			reschedule_channel(self.channel, new_messages)
+			intervals.append(frappe.db.get_value("Social Media Channel", self.channel, "poll_interval"))
+
+		self.assertEqual(intervals, [120, 240, 480, 960])
+
+	def test_failed_sync_keeps_the_interval(self):
+		reschedule_channel(self.channel, 0, failed=True)
+
+		poll_interval, next_poll_at = frappe.db.get_value(
+			"Social Media Channel", self.channel, ["poll_interval", "next_poll_at"]
+		)
+		self.assertEqual(poll_interval, 240)
+		self.assertGreater(next_poll_at, now_datetime())
+
+	@patch("social_media.api_social.start_sync_run")
+	def test_channels_fed_by_webhooks_are_not_polled(self, start_sync_run):
+		record_webhook_activity([self.channel])
+		schedule_channel_syncs()
+
+		polled = [channel for call in start_sync_run.call_args_list for channel in call.args[0]]
+		self.assertNotIn(self.channel, polled)
+		self.assertGreater(
+			frappe.db.get_value("Social Media Channel", self.channel, "next_poll_at"), now_datetime()
+		)
+
+		frappe.db.set_value(
+			"Social Media Channel", self.channel, {"last_webhook_at": None, "next_poll_at": None}
+		)
+		schedule_channel_syncs()
+
+		self.assertIn(self.channel, start_sync_run.call_args.args[0])
@@ -7,47 +7,53 @@ class WhatsAppMessage(Document):
 		# Set timestamp during document creation
 		if not self.timestamp:
 			self.timestamp = frappe.utils.now()
-	
+
 	def validate(self):
 		# Force set timestamp to ensure it's never empty
 		self.timestamp = self.timestamp or frappe.utils.now()
-		
+
 		# Validate phone number format
 		if self.phone_number and not self.phone_number.startswith('+'):
 			frappe.throw("Phone number must include country code with + prefix")
-	
+
 	def before_insert(self):
 		# Ensure timestamp is set before insert
 		if not getattr(self, 'timestamp', None):
 			self.timestamp = frappe.utils.now()
-	
+
 	def before_save(self):
 		if hasattr(self, 'modified_time'):
 			self.modified_time = frappe.utils.now()
-	
+
 	def after_insert(self):
-		"""Auto create lead after message insertion"""
-		from social_media.utils.lead_creation import create_lead_from_message
-		try:
-			create_lead_from_message(self)
-		except Exception as e:
-			frappe.log_error(f"Auto lead creation failed: {str(e)}")
-	
+		"""Hand the message to the deferred lead stage, coalesced by sender"""
+		from social_media.utils.lead_creation import queue_lead_creation
+		queue_lead_creation([self.name])
+
 	def send_message(self):
 		"""Send message via WhatsApp Business API"""
 		# Implementation for sending message
 		pass
-	
+
 	def mark_as_read(self):
 		"""Mark message as read"""
 		self.is_read = 1
 		self.delivery_status = "read"
 		self.save()
-	
+
 	def send_template_message(self, template_name, parameters=None):
 		"""Send WhatsApp template message"""
 		self.is_template_message = 1
 		self.message_type = "template"
 		if parameters:
 			self.message_content = str(parameters)
-		self.save()
\ No newline at end of file
+		self.save()
+
+
+def on_doctype_update():
+	# Platform message ids are stored once per business phone number
+	frappe.db.add_unique(
+		"WhatsApp Message", ["phone_number_id", "message_id"], constraint_name="unique_business_phone_message"
+	)
+	# Per account listing, newest first
+	frappe.db.add_index("WhatsApp Message", ["phone_number", "timestamp"], index_name="phone_number_timestamp_index")